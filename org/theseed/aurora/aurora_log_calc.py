@@ -5,6 +5,10 @@ org.theseed.aurora.aurora_log_calc -- Compute token counts from aurora logs
 
 org.theseed.aurora.aurora_log_calc is a simple script that reads the main aurora*.log files and summarizes the token counts
 
+Only the last token count in each log matters, so each log is read backward from the end in blocks, stopping at
+the last line with token data. If no token data is found within the tail limit, the whole log is scanned from
+the beginning.
+
 @author:     Bruce Parrello
 
 @copyright:  2024 Fellowship for Interpretation of Genomes. All rights reserved.
@@ -23,12 +27,18 @@ from argparse import RawDescriptionHelpFormatter
 __all__ = []
 __version__ = 0.1
 __date__ = '2024-07-24'
-__updated__ = '2024-07-24'
+__updated__ = '2026-10-19'
 
 DEBUG = 1
 TESTRUN = 0
 PROFILE = 0
 
+TOKEN_PATTERN = r'(\d+) (?:total tokens generated in database|tokens produced so far)\.'
+TOKEN_BYTES = re.compile(TOKEN_PATTERN.encode())
+TOKEN_TEXT = re.compile(TOKEN_PATTERN)
+
+BLOCK_SIZE = 64 * 1024
+
 class CLIError(Exception):
     '''Generic exception to raise and log different fatal errors.'''
     def __init__(self, msg):
@@ -39,6 +49,53 @@ class CLIError(Exception):
     def __unicode__(self):
         return self.msg
 
+def scan_backward(file, tailLimit, blockSize=BLOCK_SIZE):
+    ''' Return the last token count in a log file, reading backward from the end.
+
+        Returns 0 if the file has no token data, or None if none was found within the tail limit.
+    '''
+    with open(file, "rb") as logStream:
+        end = logStream.seek(0, os.SEEK_END)
+        pos = end
+        # This is the incomplete first line of the previous block.
+        carry = b""
+        while pos > 0:
+            if end - pos >= tailLimit:
+                return None
+            size = min(blockSize, pos)
+            pos -= size
+            logStream.seek(pos)
+            data = logStream.read(size) + carry
+            if pos > 0:
+                # The first line of the block may start in the block before it.
+                nl = data.find(b"\n")
+                if nl < 0:
+                    carry = data
+                    continue
+                carry = data[:nl + 1]
+                data = data[nl + 1:]
+            last = None
+            for last in TOKEN_BYTES.finditer(data):
+                pass
+            if last:
+                # Use the first match in the line, as a line-by-line search would.
+                lineStart = data.rfind(b"\n", 0, last.start()) + 1
+                return int(TOKEN_BYTES.search(data, lineStart).group(1))
+    return 0
+
+def scan_forward(file):
+    ''' Return the last token count in a log file and the number of lines, reading the whole file. '''
+    found = 0
+    lCount = 0
+    with open(file, "r") as logStream:
+        for line in logStream:
+            lCount += 1
+            m = TOKEN_TEXT.search(line)
+            if m:
+                # Here we have a line with token data.
+                found = int(m.group(1))
+    return found, lCount
+
 def main(argv=None): # IGNORE:C0111
     '''Command line options.'''
 
@@ -71,6 +128,7 @@ USAGE
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
         parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-t", "--tail-limit", dest="tailLimit", type=int, default=64 * 1024 * 1024, help="maximum bytes to read backward before scanning the whole log [default: %(default)s]")
         parser.add_argument(dest="path", help="path to folder with log files [default: %(default)s]", metavar="path")
 
         # Process arguments
@@ -95,16 +153,13 @@ USAGE
             if not os.path.exists(file):
                 done = True
             else:
-                lCount = 0
-                with open(file, "r") as logStream:
-                    for line in logStream:
-                        lCount += 1
-                        m = re.search(r'(\d+) (?:total tokens generated in database|tokens produced so far)\.', line)
-                        if m:
-                            # Here we have a line with token data.
-                            found = int(m.group(1))
+                found = scan_backward(file, args.tailLimit)
+                if found is not None:
+                    print(f"{found} tokens recorded in {file}.")
+                else:
+                    found, lCount = scan_forward(file)
                     print(f"{found} tokens recorded in {lCount} lines of {file}.")
-                    total += found
+                total += found
         print(f"{total} tokens total for project.")
         return 0
     except KeyboardInterrupt:
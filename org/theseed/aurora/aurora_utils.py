@@ -0,0 +1,159 @@
+# encoding: utf-8
+'''
+org.theseed.aurora.aurora_utils -- Helper functions shared by the aurora scripts
+
+org.theseed.aurora.aurora_utils contains the helpers that several of the scripts in this directory need to agree
+on: the streaming JSON array parser used for SOLR dumps and MCQ run files, the batched ID reader used by the
+lookup commands, the feature ID hash that defines the key of the feature store index, and the partition layout
+and schema files that keep the partitions of a Parquet cache readable as one table. The scripts import it
+directly, so it must stay in the same directory as they are.
+
+@author:     Bruce Parrello
+
+@copyright:  2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+@contact:    brucep.mobile@gmail.com
+'''
+
+import os
+import re
+import json
+import hashlib
+
+JSON_CHUNK_SIZE = 1024 * 1024
+
+WHITESPACE = re.compile(r'\s*')
+SEPARATORS = re.compile(r'[\s,]*')
+
+# These are the characters that can continue a JSON number.
+NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+# This is the hive partition column of a Parquet cache table.
+PARTITION_KEY = "genome_dir"
+
+# The unified schema of a Parquet cache table is saved in a file with this suffix next to the table directory.
+SCHEMA_SUFFIX = ".schema"
+
+def number_may_continue(buffer, end):
+    ''' Return True if a number decoded up to the specified position might continue in the next chunk.
+
+        The decoder stops a number at the first character that cannot extend it, so a chunk boundary after the
+        "." or "e" of a number yields a shorter number followed by a character that belongs to it.
+    '''
+    return end == len(buffer) or buffer[end] in NUMBER_CHARS
+
+def iter_json_array(stream, chunk_size=JSON_CHUNK_SIZE):
+    ''' Yield the elements of a JSON array from a text stream one at a time.
+
+        The stream is read in chunks and each element is decoded as soon as it is complete, so only one
+        element at a time is held in memory. An empty stream is treated as an empty array. Each element is
+        decoded in full by the C decoder; selecting fields is left to the caller, since skipping the unused
+        fields in Python would be slower than building them.
+    '''
+    decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        # Skip the whitespace, and once we are inside the array, the separating commas.
+        pos = (SEPARATORS if started else WHITESPACE).match(buffer, pos).end()
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("JSON input is not an array.")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            end = None
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Usually this means the element runs past the end of the buffer.
+                if eof:
+                    raise
+            # A number near the end of the buffer may continue in the next chunk.
+            if end is not None and not eof and isinstance(value, (int, float)) and number_may_continue(buffer, end):
+                end = None
+            if end is not None:
+                yield value
+                pos = end
+                continue
+        elif eof:
+            if started:
+                raise ValueError("JSON array is not terminated.")
+            return
+        # If we get here, we need more data.
+        chunk = stream.read(chunk_size)
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        eof = not chunk
+
+def read_batches(inStream, batch_size):
+    ''' Yield lists of distinct non-blank IDs from the input stream. '''
+    batch = []
+    for line in inStream:
+        key = line.strip()
+        if key:
+            batch.append(key)
+            if len(batch) >= batch_size:
+                yield list(dict.fromkeys(batch))
+                batch = []
+    if batch:
+        yield list(dict.fromkeys(batch))
+
+def unify_table_schemas(schemas):
+    ''' Merge the Arrow schemas of independently-written partitions into a single table schema.
+
+        The fields appear in order of first occurrence. Where the types of a field differ, they are promoted if
+        possible (for example, integer to double); otherwise the field becomes a string, since any scalar type
+        can be cast to a string when the table is read. None entries in the list are skipped.
+    '''
+    import pyarrow as pa
+    types = {}
+    for schema in schemas:
+        if schema is None:
+            continue
+        for field in schema:
+            if field.name not in types:
+                types[field.name] = field.type
+            elif types[field.name] != field.type:
+                try:
+                    merged = pa.unify_schemas([pa.schema([(field.name, types[field.name])]), pa.schema([field])],
+                                              promote_options="permissive")
+                    types[field.name] = merged.field(field.name).type
+                except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                    types[field.name] = pa.string()
+    return pa.schema(list(types.items()))
+
+def load_table_schema(tablepath):
+    ''' Return the unified schema of a Parquet cache table, or None if the table is empty.
+
+        The schema saved with the table is used if there is one. A cache written before the schema files were
+        introduced has its schema rebuilt from the partition footers. The partition column is not included.
+    '''
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    schema_file = tablepath + SCHEMA_SUFFIX
+    if os.path.isfile(schema_file):
+        with open(schema_file, "rb") as f:
+            return pa.ipc.read_schema(pa.py_buffer(f.read()))
+    if not os.path.isdir(tablepath):
+        return None
+    partitioning = ds.partitioning(pa.schema([(PARTITION_KEY, pa.string())]), flavor="hive")
+    dataset = ds.dataset(tablepath, format="parquet", partitioning=partitioning)
+    schemas = [fragment.physical_schema for fragment in dataset.get_fragments()]
+    return unify_table_schemas(schemas) if schemas else None
+
+def save_table_schema(tablepath, schema):
+    ''' Write the unified schema of a Parquet cache table, replacing the old one atomically. '''
+    schema_file = tablepath + SCHEMA_SUFFIX
+    with open(schema_file + ".tmp", "wb") as f:
+        f.write(schema.serialize().to_pybytes())
+    os.replace(schema_file + ".tmp", schema_file)
+
+def fid_hash(fid):
+    ''' Return the 64-bit hash of a feature ID used in the feature store index. '''
+    return int.from_bytes(hashlib.blake2b(fid.encode("utf-8"), digest_size=8).digest(), "little")
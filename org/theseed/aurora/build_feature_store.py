@@ -0,0 +1,197 @@
+#!/usr/local/bin/python3
+# encoding: utf-8
+'''
+org.theseed.aurora.build_feature_store -- Build a random-access feature store from SOLR dumps
+
+org.theseed.aurora.build_feature_store is a command that reads the genome_feature.json files in the
+subdirectories of one or more SOLR dump directories and builds a feature store that can be searched by
+feature ID and by genome. Use feature_lookup to retrieve records from the store.
+
+The store is a directory containing the following files.
+
+    features.dat    the feature records, each one a 4-byte little-endian length followed by the record
+                    as compact UTF-8 JSON; the records of each genome are contiguous
+    fid_keys.npy    a sorted array of 64-bit hashes of the feature IDs
+    fid_offsets.npy the offset in features.dat of the record for each hash in fid_keys.npy
+    genomes.tsv     the dump subdirectory name, first record offset and record count of each genome
+    store.json      the store metadata, including the name of the feature ID field
+
+A feature ID lookup is a binary search of the memory-mapped hash array followed by a single seek into the
+record file. Features without an ID are stored, but can only be found through their genome.
+
+@author:     Bruce Parrello
+
+@copyright:  2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+@contact:    brucep.mobile@gmail.com
+'''
+
+import sys
+import os
+import json
+import struct
+import functools
+import numpy as np
+
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from aurora_utils import iter_json_array, fid_hash
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-19'
+__updated__ = '2026-10-19'
+
+DEBUG = 1
+TESTRUN = 0
+PROFILE = 0
+
+LENGTH = struct.Struct("<I")
+
+class CLIError(Exception):
+    '''Generic exception to raise and log different fatal errors.'''
+    def __init__(self, msg):
+        super(CLIError).__init__(type(self))
+        self.msg = "E: %s" % msg
+    def __str__(self):
+        return self.msg
+    def __unicode__(self):
+        return self.msg
+
+def encode_dir(dirpath, key_field):
+    ''' Encode the features of a single dump directory as store records.
+
+        Returns the subdirectory name, the concatenated length-prefixed records, a list of
+        (feature ID, relative offset) pairs for the records that have an ID, and the record count.
+    '''
+    subdir = os.path.basename(dirpath)
+    data = bytearray()
+    keys = []
+    count = 0
+    fidfile = dirpath + "/genome_feature.json"
+    if os.path.isfile(fidfile):
+        with open(fidfile, "r") as f:
+            for fidobj in iter_json_array(f):
+                if not isinstance(fidobj, dict):
+                    continue
+                record = json.dumps(fidobj, separators=(",", ":")).encode("utf-8")
+                fid = fidobj.get(key_field)
+                if fid:
+                    keys.append((fid, len(data)))
+                data += LENGTH.pack(len(record))
+                data += record
+                count += 1
+    return subdir, bytes(data), keys, count
+
+def main(argv=None): # IGNORE:C0111
+    '''Command line options.'''
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+  Created by Bruce Parrello on %s.
+  Copyright 2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+  Licensed under the Apache License 2.0
+  http://www.apache.org/licenses/LICENSE-2.0
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+''' % (program_shortdesc, str(__date__))
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
+        parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-k", "--key", dest="key", default="patric_id", help="feature ID field to index [default: %(default)s]")
+        parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=os.cpu_count(), help="number of parallel parsing processes [default: %(default)s]")
+        parser.add_argument(dest="store", help="path to output feature store folder", metavar="store")
+        parser.add_argument(dest="paths", help="paths to SOLR dump folder(s)", metavar="path", nargs='+')
+
+        # Process arguments
+        args = parser.parse_args()
+
+        store = args.store
+        paths = args.paths
+        verbose = args.verbose
+
+        if verbose > 0:
+            print("Verbose mode on")
+        Path(store).mkdir(parents=True, exist_ok=True)
+        dirpaths = []
+        for inpath in paths:
+            dirpaths.extend(inpath + "/" + f.name for f in os.scandir(inpath) if f.is_dir())
+        dirpaths.sort()
+        print(f"{len(dirpaths)} directories found.")
+        # The hashes and offsets are accumulated in compact arrays.
+        hashes = array('Q')
+        offsets = array('Q')
+        offset = 0
+        recordCount = 0
+        encoder = functools.partial(encode_dir, key_field=args.key)
+        with open(store + "/features.dat", "wb") as dataStream, open(store + "/genomes.tsv", "w") as genomeStream, \
+                ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            for subdir, data, keys, count in executor.map(encoder, dirpaths, chunksize=4):
+                dataStream.write(data)
+                for fid, relative in keys:
+                    hashes.append(fid_hash(fid))
+                    offsets.append(offset + relative)
+                genomeStream.write(f"{subdir}\t{offset}\t{count}\n")
+                offset += len(data)
+                recordCount += count
+                if verbose > 1:
+                    print(f"{count} features stored for {subdir}.")
+        # Sort the index by hash. The sort is stable, so colliding IDs stay in file order.
+        print(f"Sorting index of {len(hashes)} feature IDs.")
+        keyArray = np.frombuffer(hashes, dtype=np.uint64)
+        order = np.argsort(keyArray, kind="stable")
+        np.save(store + "/fid_keys.npy", keyArray[order])
+        np.save(store + "/fid_offsets.npy", np.frombuffer(offsets, dtype=np.uint64)[order])
+        with open(store + "/store.json", "w") as f:
+            json.dump({"key": args.key, "records": recordCount, "genomes": len(dirpaths)}, f)
+        print(f"{recordCount} features from {len(dirpaths)} genomes written to {store}.")
+        return 0
+    except KeyboardInterrupt:
+        ### handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TESTRUN:
+            raise(e)
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+if __name__ == "__main__":
+    if DEBUG:
+        sys.argv.append("-v")
+    if TESTRUN:
+        import doctest
+        doctest.testmod()
+    if PROFILE:
+        import cProfile
+        import pstats
+        profile_filename = 'org.theseed.aurora.build_feature_store_profile.txt'
+        cProfile.run('main()', profile_filename)
+        statsfile = open("profile_stats.txt", "wb")
+        p = pstats.Stats(profile_filename, stream=statsfile)
+        stats = p.strip_dirs().sort_stats('cumulative')
+        stats.print_stats()
+        statsfile.close()
+        sys.exit(0)
+    sys.exit(main())
@@ -0,0 +1,190 @@
+#!/usr/local/bin/python3
+# encoding: utf-8
+'''
+org.theseed.aurora.build_fid_index -- Build a SQLite feature lookup index from CoreSEED
+
+org.theseed.aurora.build_fid_index reads the Features/<type>/tbl files of a CoreSEED data directory and
+writes a SQLite database that maps each FIG ID and each alias to the feature's genome, type and location.
+The genome directories are parsed in parallel by a process pool, and the parsed records are loaded into
+the database by the main process. Use fid_lookup to query the resulting database.
+
+@author:     Bruce Parrello
+
+@copyright:  2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+@contact:    brucep.mobile@gmail.com
+'''
+
+import sys
+import os
+import sqlite3
+
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-19'
+__updated__ = '2026-10-19'
+
+DEBUG = 1
+TESTRUN = 0
+PROFILE = 0
+
+SCHEMA = [
+    "CREATE TABLE features (fid TEXT PRIMARY KEY, genome TEXT NOT NULL, type TEXT NOT NULL, location TEXT) WITHOUT ROWID",
+    "CREATE TABLE aliases (alias TEXT NOT NULL, fid TEXT NOT NULL)",
+]
+
+INDEXES = [
+    "CREATE INDEX aliases_alias ON aliases (alias)",
+]
+
+class CLIError(Exception):
+    '''Generic exception to raise and log different fatal errors.'''
+    def __init__(self, msg):
+        super(CLIError).__init__(type(self))
+        self.msg = "E: %s" % msg
+    def __str__(self):
+        return self.msg
+    def __unicode__(self):
+        return self.msg
+
+def read_genome(genome_path):
+    ''' Parse the feature tables for one genome directory.
+
+        Returns the genome ID, a list of (fid, genome, type, location) tuples and a list of (alias, fid)
+        tuples.
+    '''
+    genome = os.path.basename(genome_path)
+    features = []
+    aliases = []
+    featdir = genome_path + "/Features"
+    if os.path.isdir(featdir):
+        type_dirs = [type_dir.name for type_dir in os.scandir(featdir) if type_dir.is_dir()]
+        for type_dir in type_dirs:
+            tbl_file = featdir + "/" + type_dir + "/tbl"
+            if not os.path.isfile(tbl_file):
+                continue
+            with open(tbl_file, "r") as tbl_stream:
+                for line in tbl_stream:
+                    fields = line.rstrip("\n").split("\t")
+                    fid = fields[0]
+                    if not fid:
+                        continue
+                    location = fields[1] if len(fields) > 1 else ""
+                    features.append((fid, genome, type_dir, location))
+                    for i in range(2, len(fields)):
+                        if fields[i]:
+                            aliases.append((fields[i], fid))
+    return genome, features, aliases
+
+def main(argv=None): # IGNORE:C0111
+    '''Command line options.'''
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+  Created by Bruce Parrello on %s.
+  Copyright 2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+  Licensed under the Apache License 2.0
+  http://www.apache.org/licenses/LICENSE-2.0
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+''' % (program_shortdesc, str(__date__))
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
+        parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=os.cpu_count(), help="number of parallel parsing processes [default: %(default)s]")
+        parser.add_argument(dest="path", help="path to CoreSEED data directory", metavar="path")
+        parser.add_argument(dest="dbfile", help="path to output SQLite database", metavar="dbfile")
+
+        # Process arguments
+        args = parser.parse_args()
+
+        path = args.path
+        dbfile = args.dbfile
+        verbose = args.verbose
+
+        if verbose > 0:
+            print("Verbose mode on")
+        orgdir = path + "/Organisms"
+        if not os.path.isdir(orgdir):
+            raise CLIError(f"{path} is not a CoreSEED data directory.")
+        genome_paths = sorted(orgdir + "/" + genome_dir.name for genome_dir in os.scandir(orgdir) if genome_dir.is_dir())
+        print(f"{len(genome_paths)} genomes found in {orgdir}.")
+        # The database is always rebuilt from scratch.
+        if os.path.exists(dbfile):
+            os.remove(dbfile)
+        conn = sqlite3.connect(dbfile)
+        # This is a bulk load into a throwaway file, so we turn off the safety features.
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        for stmt in SCHEMA:
+            conn.execute(stmt)
+        fidCount = 0
+        aliasCount = 0
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            for genome, features, aliases in executor.map(read_genome, genome_paths, chunksize=4):
+                conn.executemany("INSERT OR REPLACE INTO features VALUES (?, ?, ?, ?)", features)
+                conn.executemany("INSERT INTO aliases VALUES (?, ?)", aliases)
+                fidCount += len(features)
+                aliasCount += len(aliases)
+                if verbose > 0:
+                    print(f"{len(features)} features and {len(aliases)} aliases loaded for {genome}.")
+        conn.commit()
+        # The alias index is built after the load, which is much faster than maintaining it row by row.
+        print("Building alias index.")
+        for stmt in INDEXES:
+            conn.execute(stmt)
+        conn.execute("ANALYZE")
+        conn.commit()
+        conn.close()
+        print(f"{fidCount} features and {aliasCount} aliases written to {dbfile}.")
+        return 0
+    except KeyboardInterrupt:
+        ### handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TESTRUN:
+            raise(e)
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+if __name__ == "__main__":
+    if DEBUG:
+        sys.argv.append("-v")
+    if TESTRUN:
+        import doctest
+        doctest.testmod()
+    if PROFILE:
+        import cProfile
+        import pstats
+        profile_filename = 'org.theseed.aurora.build_fid_index_profile.txt'
+        cProfile.run('main()', profile_filename)
+        statsfile = open("profile_stats.txt", "wb")
+        p = pstats.Stats(profile_filename, stream=statsfile)
+        stats = p.strip_dirs().sort_stats('cumulative')
+        stats.print_stats()
+        statsfile.close()
+        sys.exit(0)
+    sys.exit(main())
@@ -4,31 +4,443 @@
 This script looks at a FASTQ dump directory created by genome.download and deletes the incomplete dumps.
 An incomplete dump is one that has no summary.txt file.
 
+Only the immediate subdirectories of the dump directory are examined, and the incomplete dumps are deleted by
+a bounded pool of threads, so the deletions overlap on slow network file systems.
+
+With the --verify option, the FASTQ files (plain or gzipped) in each complete dump are also read to make sure
+every record has a header, sequence, separator and quality line, and that the sequence and quality lengths
+match. The spot and read count lines that fasterq-dump or fastq-dump writes to summary.txt are compared with
+the number of records found; no other lines are used. The files are verified in a process pool, and the
+results are cached in the dump directory by file size and modification time, so an unchanged file is never
+read twice. A dump is invalid if it has no FASTQ files or a damaged one, mismatched if its record count
+disagrees with summary.txt, and unverifiable if summary.txt has no count lines. All three are listed, but only
+the invalid dumps are deleted, and only if --delete-invalid is specified.
+
+With the --watch option, the script runs alongside genome.download until it is interrupted. It tracks the dump
+subdirectories as they are created and written, using Linux inotify where it is available and otherwise
+rescanning the dump directory at each poll interval. A dump that receives a summary.txt file is complete and
+is no longer tracked. A dump that sees no activity for the stale timeout without receiving a summary.txt file
+is deleted. Before a dump is deleted, the modification times of its files are checked, so activity that was
+not reported by inotify (for example, in a nested directory) still keeps it alive.
+
 Usage:
-    python check_fastq_dump.py <dump_directory>
+    python check_fastq_dump.py [options] <dump_directory>
+
+Options:
+    -t, --threads N         number of deletion threads (default: 8)
+    --verify                verify the FASTQ files in the complete dumps; the results are cached in
+                            <dump_directory>/.fastq_verify_cache.json and saved every 100 files, so an
+                            interrupted run can be resumed
+    --delete-invalid        with --verify, also delete the invalid dumps
+    -j, --jobs N            number of verification processes (default: number of CPUs)
+    --watch                 watch for stale dumps until interrupted, instead of checking once
+    --stale-timeout SECS    with --watch, seconds without activity before a dump without summary.txt is
+                            deleted (default: 3600)
+    --poll-interval SECS    with --watch, seconds between stale checks or polling scans (default: 30)
 '''
 import sys
 import argparse
 import os
+import re
+import json
+import gzip
 import shutil
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+FASTQ_SUFFIXES = (".fastq", ".fq", ".fastq.gz", ".fq.gz")
+
+CACHE_NAME = ".fastq_verify_cache.json"
+
+# This is the number of newly verified files between saves of the cache.
+CACHE_SAVE_INTERVAL = 100
+
+# This matches a count line written by fasterq-dump, such as "spots read      : 1,000" or "reads written : 2000".
+COUNT_PATTERN = re.compile(r'^\s*((?:spots|reads) (?:read|written))\s*:\s*(\d[\d,]*)\s*$', re.IGNORECASE)
+
+# This matches a count line written by fastq-dump, such as "Read 1000 spots for SRR123" or "Written 1000 spots for
+# SRR123".
+SPOTS_PATTERN = re.compile(r'^(Read|Written) (\d[\d,]*) spots for \S+\s*$')
+
+# These are the inotify event flags we use, from <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+TOP_MASK = IN_CREATE | IN_MOVED_TO
+DUMP_MASK = IN_CREATE | IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_DELETE_SELF
+
+INOTIFY_EVENT = struct.Struct("iIII")
+
+def find_incomplete(indir):
+    """Return the paths of the dump subdirectories that have no summary.txt file."""
+    retVal = []
+    with os.scandir(indir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and not os.path.isfile(os.path.join(entry.path, "summary.txt")):
+                retVal.append(entry.path)
+    return sorted(retVal)
+
+def find_complete(indir):
+    """Return the paths of the dump subdirectories that have a summary.txt file."""
+    retVal = []
+    with os.scandir(indir) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and os.path.isfile(os.path.join(entry.path, "summary.txt")):
+                retVal.append(entry.path)
+    return sorted(retVal)
+
+def find_fastq(dumpdir):
+    """Return the paths of the FASTQ files in a dump."""
+    retVal = []
+    for root, dirs, files in os.walk(dumpdir):
+        retVal.extend(os.path.join(root, f) for f in files if f.endswith(FASTQ_SUFFIXES))
+    return sorted(retVal)
+
+def verify_fastq(fname):
+    """Verify the record structure of a FASTQ file.
+
+    Returns the number of records and an error message, which is None if the file is valid.
+    """
+    records = 0
+    opener = gzip.open if fname.endswith(".gz") else open
+    try:
+        with opener(fname, "rb") as infile:
+            for header in infile:
+                # Blank lines between records are tolerated.
+                if not header.strip():
+                    continue
+                seq = infile.readline()
+                plus = infile.readline()
+                qual = infile.readline()
+                if not qual:
+                    return records, f"truncated record after {records} records"
+                if not header.startswith(b"@") or not plus.startswith(b"+"):
+                    return records, f"malformed record {records + 1}"
+                if len(seq.rstrip(b"\r\n")) != len(qual.rstrip(b"\r\n")):
+                    return records, f"sequence and quality lengths differ in record {records + 1}"
+                records += 1
+    except (OSError, EOFError) as e:
+        return records, f"read error after {records} records: {e}"
+    return records, None
+
+def summary_counts(dumpdir):
+    """Return the counts in a dump's summary.txt file.
+
+    Only the count lines in the exact formats written by fasterq-dump and fastq-dump are used, so other numbers
+    in the summary (such as a read length) are never mistaken for counts. Returns a dictionary mapping each
+    label ("spots read", "spots written", "reads read" or "reads written") to its count; the dictionary is
+    empty if the summary has no count lines.
+    """
+    retVal = {}
+    with open(os.path.join(dumpdir, "summary.txt"), "r", errors="replace") as f:
+        for line in f:
+            m = COUNT_PATTERN.match(line)
+            if m:
+                label = " ".join(m.group(1).lower().split())
+                count = m.group(2)
+            else:
+                m = SPOTS_PATTERN.match(line)
+                if not m:
+                    continue
+                label = "spots " + m.group(1).lower()
+                count = m.group(2)
+            retVal.setdefault(label, int(count.replace(",", "")))
+    return retVal
+
+def check_counts(counts, summary):
+    """Compare the record counts of a dump's FASTQ files with the counts from its summary.
 
+    The written counts are used if there are any, since reads can be filtered out after they are read. The
+    files match if their total equals a summary count or, for split paired reads where each file has one record
+    per spot, if one file's count does. Returns None if the files match; otherwise, a description of the
+    mismatch.
+    """
+    expected = [summary[label] for label in ("reads written", "spots written") if label in summary]
+    if not expected:
+        expected = [summary[label] for label in ("reads read", "spots read") if label in summary]
+    total = sum(counts)
+    if any(count == total or count in counts for count in expected):
+        return None
+    labels = ", ".join(f"{label} {count}" for label, count in summary.items())
+    return f"{total} records found, but summary.txt reports {labels}"
+
+def load_cache(cache_file):
+    """Return the verification cache, mapping each file path to its size, mtime, record count and error."""
+    if not os.path.isfile(cache_file):
+        return {}
+    try:
+        with open(cache_file, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {}
+
+def save_cache(cache_file, cache):
+    """Write the verification cache, replacing the old one atomically."""
+    with open(cache_file + ".tmp", "w") as f:
+        json.dump(cache, f)
+    os.replace(cache_file + ".tmp", cache_file)
+
+def verify_dumps(indir, dumps, jobs):
+    """Verify the FASTQ files of the specified dumps.
+
+    Returns a list of (dump, status, reason) tuples for the dumps that did not pass. The status is "invalid" if
+    the dump has no FASTQ files or a file is damaged, "mismatched" if the record count disagrees with the summary,
+    and "unverifiable" if the summary has no count that can be checked.
+    """
+    cache_file = os.path.join(indir, CACHE_NAME)
+    cache = load_cache(cache_file)
+    dumpFiles = {dumpdir: find_fastq(dumpdir) for dumpdir in dumps}
+    results = {}
+    pending = []
+    for fnames in dumpFiles.values():
+        for fname in fnames:
+            st = os.stat(fname)
+            entry = cache.get(fname)
+            if entry and entry["size"] == st.st_size and entry["mtime"] == st.st_mtime_ns:
+                results[fname] = entry
+            else:
+                pending.append((fname, st.st_size, st.st_mtime_ns))
+    sys.stderr.write(f"{len(results)} FASTQ files cached, {len(pending)} to verify.\n")
+    # The cache is saved as the results arrive, so an interrupted run loses very little work. Only files that
+    # still exist are kept in it.
+    executor = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        verified = executor.map(verify_fastq, [p[0] for p in pending])
+        for i, ((fname, size, mtime), (records, error)) in enumerate(zip(pending, verified), start=1):
+            results[fname] = {"size": size, "mtime": mtime, "records": records, "error": error}
+            if i % CACHE_SAVE_INTERVAL == 0:
+                save_cache(cache_file, results)
+    finally:
+        executor.shutdown(cancel_futures=True)
+        save_cache(cache_file, results)
+    retVal = []
+    for dumpdir, fnames in dumpFiles.items():
+        errors = [f"{os.path.basename(fname)}: {results[fname]['error']}" for fname in fnames if results[fname]["error"]]
+        counts = [results[fname]["records"] for fname in fnames]
+        if not fnames:
+            retVal.append((dumpdir, "invalid", "no FASTQ files"))
+        elif errors:
+            retVal.append((dumpdir, "invalid", "; ".join(errors)))
+        else:
+            summary = summary_counts(dumpdir)
+            if not summary:
+                retVal.append((dumpdir, "unverifiable", "summary.txt has no spot or read count"))
+            else:
+                mismatch = check_counts(counts, summary)
+                if mismatch:
+                    retVal.append((dumpdir, "mismatched", mismatch))
+    return retVal
+
+class Inotify:
+    """This object is a minimal wrapper for the Linux inotify interface."""
+
+    def __init__(self):
+        name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not supported")
+        self.libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask):
+        """Watch a directory. Returns the watch descriptor, or -1 if the watch could not be added."""
+        return self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+
+    def rm_watch(self, wd):
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout):
+        """Wait up to the specified number of seconds for events. Returns a list of (wd, mask, name) tuples."""
+        retVal = []
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                data = b""
+            pos = 0
+            while pos < len(data):
+                wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(data, pos)
+                pos += INOTIFY_EVENT.size
+                name = os.fsdecode(data[pos:pos + length].rstrip(b"\0"))
+                pos += length
+                retVal.append((wd, mask, name))
+        return retVal
+
+    def close(self):
+        os.close(self.fd)
+
+def last_activity(dumpdir):
+    """Return the latest modification time of a dump directory or any of its files."""
+    retVal = 0.0
+    for root, dirs, files in os.walk(dumpdir):
+        for name in [root] + [os.path.join(root, f) for f in files]:
+            try:
+                retVal = max(retVal, os.stat(name).st_mtime)
+            except FileNotFoundError:
+                pass
+    return retVal
+
+def list_dumps(indir):
+    """Return the paths of all the dump subdirectories."""
+    with os.scandir(indir) as entries:
+        return [entry.path for entry in entries if entry.is_dir(follow_symlinks=False)]
+
+def watch_dumps(indir, stale_timeout, poll_interval, threads):
+    """Watch the dump directory and delete dumps that go stale without a summary.txt file.
+
+    This runs until interrupted, and returns the number of dumps deleted.
+    """
+    try:
+        notifier = Inotify()
+        if notifier.add_watch(indir, TOP_MASK) < 0:
+            notifier.close()
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed")
+        sys.stderr.write(f"Watching {indir} with inotify.\n")
+    except OSError as e:
+        notifier = None
+        sys.stderr.write(f"inotify unavailable ({e}), polling {indir} every {poll_interval} seconds.\n")
+    # This maps each incomplete dump to the time of its last known activity.
+    activity = {}
+    # This maps each inotify watch descriptor to its dump.
+    watches = {}
+    deleted = 0
+
+    def track(dumpdir, when):
+        if os.path.isfile(os.path.join(dumpdir, "summary.txt")):
+            return
+        if dumpdir not in activity and notifier:
+            wd = notifier.add_watch(dumpdir, DUMP_MASK)
+            if wd >= 0:
+                watches[wd] = dumpdir
+        activity.setdefault(dumpdir, when)
+
+    def untrack(dumpdir):
+        activity.pop(dumpdir, None)
+        for wd in [wd for wd, path in watches.items() if path == dumpdir]:
+            del watches[wd]
+            if notifier:
+                notifier.rm_watch(wd)
+
+    def rescan():
+        for dumpdir in list_dumps(indir):
+            if dumpdir not in activity:
+                track(dumpdir, last_activity(dumpdir))
+
+    rescan()
+    sys.stderr.write(f"{len(activity)} incomplete dumps being tracked.\n")
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            while True:
+                if notifier:
+                    now = time.time()
+                    for wd, mask, name in notifier.read_events(poll_interval):
+                        if mask & IN_Q_OVERFLOW:
+                            # Some events were lost, so we fall back to a scan.
+                            rescan()
+                        elif wd not in watches:
+                            if mask & IN_ISDIR:
+                                track(os.path.join(indir, name), now)
+                        elif mask & IN_IGNORED:
+                            watches.pop(wd, None)
+                        elif name == "summary.txt":
+                            untrack(watches[wd])
+                        else:
+                            activity[watches[wd]] = now
+                else:
+                    time.sleep(poll_interval)
+                    rescan()
+                # Check the dumps that appear to be stale.
+                limit = time.time() - stale_timeout
+                stale = []
+                for dumpdir, when in list(activity.items()):
+                    if when >= limit:
+                        continue
+                    if not os.path.isdir(dumpdir) or os.path.isfile(os.path.join(dumpdir, "summary.txt")):
+                        untrack(dumpdir)
+                        continue
+                    when = last_activity(dumpdir)
+                    if when >= limit:
+                        activity[dumpdir] = when
+                    else:
+                        stale.append(dumpdir)
+                        untrack(dumpdir)
+                deleted += sum(executor.map(delete_dump, stale))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if notifier:
+            notifier.close()
+    return deleted
+
+def delete_dump(dumpdir):
+    """Delete a bad dump. Returns True if it was deleted."""
+    sys.stderr.write(f"Deleting dump: {dumpdir}\n")
+    try:
+        shutil.rmtree(dumpdir)
+        return True
+    except OSError as e:
+        sys.stderr.write(f"Error deleting {dumpdir}: {e}\n")
+        return False
 
 def main():
     parser = argparse.ArgumentParser(description="Check the integrity of FASTQ dump files.")
+    parser.add_argument("-t", "--threads", type=int, default=8, help="Number of deletion threads (default: 8)")
+    parser.add_argument("--verify", action="store_true", help="Verify the FASTQ files in the complete dumps")
+    parser.add_argument("--delete-invalid", action="store_true", help="Delete dumps that fail verification")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="Number of verification processes (default: number of CPUs)")
+    parser.add_argument("--watch", action="store_true", help="Watch for stale dumps until interrupted")
+    parser.add_argument("--stale-timeout", type=float, default=3600,
+                        help="Seconds without activity before a dump without summary.txt is stale (default: 3600)")
+    parser.add_argument("--poll-interval", type=float, default=30,
+                        help="Seconds between stale checks or polling scans (default: 30)")
     parser.add_argument("dump_directory", type=str, help="Directory containing FASTQ dumps")
     args = parser.parse_args()
     indir = os.path.abspath(args.dump_directory)
     if not os.path.isdir(indir):
         sys.stderr.write(f"Error: {indir} is not a valid directory.\n")
         return 1
+    if args.watch:
+        deleted = watch_dumps(indir, args.stale_timeout, args.poll_interval, max(1, args.threads))
+        sys.stderr.write(f"{deleted} stale dumps deleted.\n")
+        return 0
 
-    for root, dirs, files in os.walk(indir):
-        # Only proceed if we are NOT the top-level directory.
-        if indir != root:
-            if not ("summary.txt" in files):
-                # This is an incomplete dump.  We will delete it.
-                sys.stderr.write(f"Deleting incomplete dump: {root}\n")
-                shutil.rmtree(root)
+    incomplete = find_incomplete(indir)
+    sys.stderr.write(f"{len(incomplete)} incomplete dumps found.\n")
+    toDelete = list(incomplete)
+    invalid = []
+    mismatched = []
+    if args.verify:
+        failed = verify_dumps(indir, find_complete(indir), max(1, args.jobs))
+        for dumpdir, status, reason in failed:
+            sys.stderr.write(f"Dump {dumpdir} is {status}: {reason}\n")
+        invalid = [dumpdir for dumpdir, status, reason in failed if status == "invalid"]
+        mismatched = [dumpdir for dumpdir, status, reason in failed if status == "mismatched"]
+        unverifiable = len(failed) - len(invalid) - len(mismatched)
+        sys.stderr.write(f"{len(invalid)} invalid, {len(mismatched)} mismatched and {unverifiable} unverifiable "
+                         "dumps found.\n")
+        # Only damaged dumps are deleted. A count mismatch may be a summary problem, so it is left for review.
+        if args.delete_invalid:
+            toDelete.extend(invalid)
+    with ThreadPoolExecutor(max_workers=max(1, args.threads)) as executor:
+        deleted = sum(executor.map(delete_dump, toDelete))
+    sys.stderr.write(f"{deleted} dumps deleted.\n")
+    if deleted < len(toDelete) or mismatched or (invalid and not args.delete_invalid):
+        return 1
     return 0
 
 if __name__ == "__main__":
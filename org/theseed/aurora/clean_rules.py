@@ -5,6 +5,17 @@ org.theseed.aurora.clean_rules -- clean recently-generated rule files
 
 org.theseed.aurora.clean_rules is a command that finds recent subsystem rules files and deletes them
 
+The files to delete are described by cleanup policies, each specified with a --policy option in the form
+
+    pattern,age[,companion...]
+
+where "pattern" is a file name glob, "age" is "<" (newer than) or ">" (older than) followed by a number and a
+unit of "s", "m", "h" or "d", and each "companion" is the name of another file in the same directory that is
+deleted along with a matching file. The default policy is "checkvariant_rules,<24h,checkvariant_definitions",
+which deletes the rules generated in the last day along with their definitions. All the policies are applied
+in a single pass over the subsystem directories, and the directories are scanned in a thread pool, so the
+file metadata requests overlap. Use --dry-run to list the files without deleting them.
+
 @author:     Bruce Parrello
 
 @copyright:  2025 Fellowship for Interpretation of Genomes. All rights reserved.
@@ -15,20 +26,31 @@ org.theseed.aurora.clean_rules is a command that finds recent subsystem rules fi
 
 import sys
 import os
+import re
+import fnmatch
+import functools
 
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
+from concurrent.futures import ThreadPoolExecutor
 import time
 
 __all__ = []
 __version__ = 0.1
 __date__ = '2025-01-23'
-__updated__ = '2025-01-23'
+__updated__ = '2026-10-19'
 
 DEBUG = 1
 TESTRUN = 0
 PROFILE = 0
 
+DEFAULT_POLICY = "checkvariant_rules,<24h,checkvariant_definitions"
+
+# This maps each age unit to its length in seconds.
+AGE_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 24 * 3600}
+
+AGE_PATTERN = re.compile(r'([<>])(\d+(?:\.\d+)?)([smhd])$')
+
 class CLIError(Exception):
     '''Generic exception to raise and log different fatal errors.'''
     def __init__(self, msg):
@@ -39,6 +61,62 @@ class CLIError(Exception):
     def __unicode__(self):
         return self.msg
 
+class Policy:
+    ''' This object describes a cleanup policy: a file name glob, an age window, and companion files. '''
+
+    def __init__(self, spec):
+        parts = [part.strip() for part in spec.split(",")]
+        if len(parts) < 2 or not parts[0]:
+            raise CLIError(f"Invalid policy \"{spec}\": the format is pattern,age[,companion...].")
+        m = AGE_PATTERN.match(parts[1])
+        if not m:
+            raise CLIError(f"Invalid age \"{parts[1]}\" in policy \"{spec}\".")
+        self.spec = spec
+        self.pattern = parts[0]
+        self.newer = (m.group(1) == "<")
+        self.age = float(m.group(2)) * AGE_UNITS[m.group(3)]
+        self.companions = [part for part in parts[2:] if part]
+
+    def matches_name(self, name):
+        ''' Return True if a file name matches the policy's pattern. '''
+        return fnmatch.fnmatchcase(name, self.pattern)
+
+    def matches_age(self, modtime, currtime):
+        ''' Return True if a file with the specified modification time is in the policy's age window. '''
+        age = currtime - modtime
+        return age < self.age if self.newer else age > self.age
+
+def scan_subsystem(subsysdir, policies, currtime, dryRun):
+    ''' Apply the cleanup policies to a single subsystem directory.
+
+        Returns a list of the files deleted (or, for a dry run, the files that would be deleted).
+    '''
+    targets = {}
+    with os.scandir(subsysdir) as entries:
+        entries = list(entries)
+    names = set(entry.name for entry in entries)
+    for entry in entries:
+        # The file is only stat'ed if its name matches a policy.
+        matching = [policy for policy in policies if policy.matches_name(entry.name)]
+        if matching and entry.is_file():
+            modtime = entry.stat().st_mtime
+            for policy in matching:
+                if policy.matches_age(modtime, currtime):
+                    targets[entry.name] = True
+                    for companion in policy.companions:
+                        if companion in names:
+                            targets[companion] = True
+    retVal = []
+    for name in targets:
+        fileName = subsysdir + "/" + name
+        if not dryRun:
+            try:
+                os.remove(fileName)
+            except FileNotFoundError:
+                continue
+        retVal.append(fileName)
+    return retVal
+
 def main(argv=None): # IGNORE:C0111
     '''Command line options.'''
 
@@ -71,6 +149,10 @@ USAGE
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
         parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-p", "--policy", dest="policies", action="append", help=f"cleanup policy (repeatable) [default: {DEFAULT_POLICY}]", metavar="policy")
+        parser.add_argument("-s", "--subdir", dest="subdir", default="Subsystems", help="subdirectory of the core folder to clean [default: %(default)s]")
+        parser.add_argument("-t", "--threads", dest="threads", type=int, default=32, help="number of scanning threads [default: %(default)s]")
+        parser.add_argument("-n", "--dry-run", dest="dryRun", action="store_true", help="list the files to delete without deleting them")
         parser.add_argument(dest="path", help="path to core folder", metavar="path")
 
         # Process arguments
@@ -82,18 +164,21 @@ USAGE
         if verbose > 0:
             print("Verbose mode on")
 
-        subsysbase = path + "/" + "Subsystems"
-        subsystems = os.listdir(subsysbase)
+        policies = [Policy(spec) for spec in (args.policies or [DEFAULT_POLICY])]
+        subsysbase = path + "/" + args.subdir
+        with os.scandir(subsysbase) as entries:
+            subsystems = sorted(entry.path for entry in entries if entry.is_dir())
         currtime = time.time()
-        for subsystem in subsystems:
-            checkFile = subsysbase + "/" + subsystem + "/checkvariant_rules"
-            if os.path.isfile(checkFile):
-                modtime = os.path.getmtime(checkFile)
-                if (currtime - modtime) < (24 * 3600):
-                    os.remove(checkFile)
-                    checkFile2 = subsysbase + "/" + subsystem + "/checkvariant_definitions"
-                    if os.path.exists(checkFile2):
-                        os.remove(checkFile2)
+        scanner = functools.partial(scan_subsystem, policies=policies, currtime=currtime, dryRun=args.dryRun)
+        fileCount = 0
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            for fileNames in executor.map(scanner, subsystems):
+                for fileName in fileNames:
+                    if args.dryRun or verbose > 1:
+                        print(fileName)
+                fileCount += len(fileNames)
+        verb = "would be deleted" if args.dryRun else "deleted"
+        print(f"{len(subsystems)} directories scanned, {fileCount} files {verb}.")
         return 0
     except KeyboardInterrupt:
         ### handle keyboard interrupt ###
@@ -5,42 +5,216 @@ This script concatenates multiple text files into a single output file. The defa
 is to create the output on the standard output, but an output file can be specified with the -o option.
 The input files are specified as positional arguments.
 
+The files are copied as raw bytes. When possible, the copy is done inside the kernel (copy_file_range for a
+regular output file, otherwise sendfile), so the data never passes through Python; if neither works, a
+fixed-size buffered copy is used. Memory use does not depend on the size of the input files.
+
+Directories are traversed in sorted order, so the same inputs always produce the same output. With the
+--compress option, the output is compressed with gzip or zstd. The input is divided into fixed-size blocks
+that are compressed in a thread pool while reading continues, and each block becomes an independent gzip
+member or zstd frame, which standard decompressors read as a single stream. The gzip members carry no
+timestamp, so compressed output is reproducible as well.
+
+With the --dedup option, files whose content is identical to that of an earlier input are skipped. Only files
+that share their size with another input are read and hashed, and the hashing is done in a thread pool. The
+number of duplicates and the bytes saved are reported at the end.
+
 Usage:
     python combine_text_files.py -o <output_file> <input_file1> <input_file2> ... <input_fileN>
 '''
 import sys
 import argparse
 import os
+import shutil
+import stat
+import gzip
+import hashlib
+import collections
 
-def copy_file(fname, outfile):
+from concurrent.futures import ThreadPoolExecutor
+
+COPY_BUFFER = 1024 * 1024
+
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# These are the compression levels for each compression method.
+LEVELS = {"gzip": 6, "zstd": 3}
+
+def kernel_copy(infile, outfile, size):
+    """Copy an input file to the output inside the kernel. Returns the number of bytes copied."""
+    in_fd = infile.fileno()
+    out_fd = outfile.fileno()
+    pos = 0
+    # copy_file_range only works between regular files.
+    if hasattr(os, "copy_file_range") and stat.S_ISREG(os.fstat(out_fd).st_mode):
+        try:
+            while pos < size:
+                n = os.copy_file_range(in_fd, out_fd, size - pos, pos)
+                if n == 0:
+                    break
+                pos += n
+            return pos
+        except OSError:
+            pass
+    if hasattr(os, "sendfile"):
+        try:
+            while pos < size:
+                n = os.sendfile(out_fd, in_fd, pos, size - pos)
+                if n == 0:
+                    break
+                pos += n
+        except OSError:
+            pass
+    return pos
+
+def list_inputs(inputs):
+    """Return the input file names, with each directory expanded in sorted order."""
+    fnames = []
+    for fname in inputs:
+        if os.path.isdir(fname):
+            sys.stderr.write(f"Processing directory: {fname}\n")
+            for root, dirs, files in os.walk(fname):
+                # Sorting dirs in place makes os.walk descend in sorted order.
+                dirs.sort()
+                for f in sorted(files):
+                    fnames.append(os.path.join(root, f))
+        else:
+            fnames.append(fname)
+    return fnames
+
+def check_file(fname):
     sys.stderr.write(f"Copying {fname} to output.\n")
     if not os.path.isfile(fname):
         sys.stderr.write(f"Error: {fname} is not a valid file.\n")
+        return False
+    return True
+
+def copy_file(fname, outfile):
+    if not check_file(fname):
         return
-    with open(fname) as infile:
-        outfile.write(infile.read())
+    with open(fname, "rb") as infile:
+        # The kernel writes at the file descriptor's position, so anything still buffered must go first.
+        outfile.flush()
+        pos = kernel_copy(infile, outfile, os.fstat(infile.fileno()).st_size)
+        # Whatever the kernel did not copy is copied through a fixed-size buffer.
+        infile.seek(pos)
+        shutil.copyfileobj(infile, outfile, COPY_BUFFER)
+
+def file_hash(fname):
+    """Return a digest of a file's content."""
+    digest = hashlib.blake2b()
+    with open(fname, "rb") as infile:
+        while True:
+            data = infile.read(COPY_BUFFER)
+            if not data:
+                break
+            digest.update(data)
+    return digest.digest()
+
+def dedup_inputs(fnames, threads):
+    """Remove the files whose content duplicates that of an earlier file.
+
+    Returns the list of files to keep, the number of duplicates removed, and the number of bytes saved.
+    """
+    sizes = {}
+    for fname in fnames:
+        if os.path.isfile(fname):
+            sizes[fname] = os.path.getsize(fname)
+    # Only files that share a size with another file can be duplicates.
+    sizeCounts = collections.Counter(sizes.values())
+    candidates = list(dict.fromkeys(fname for fname, size in sizes.items() if sizeCounts[size] > 1))
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        hashes = dict(zip(candidates, executor.map(file_hash, candidates)))
+    kept = []
+    seen = set()
+    duplicates = 0
+    saved = 0
+    for fname in fnames:
+        if fname in hashes:
+            key = (sizes[fname], hashes[fname])
+            if key in seen:
+                duplicates += 1
+                saved += sizes[fname]
+                continue
+            seen.add(key)
+        kept.append(fname)
+    return kept, duplicates, saved
+
+def iter_blocks(fnames, block_size=BLOCK_SIZE):
+    """Yield the concatenated contents of the input files in blocks of a fixed size."""
+    block = bytearray()
+    for fname in fnames:
+        if not check_file(fname):
+            continue
+        with open(fname, "rb") as infile:
+            while True:
+                data = infile.read(block_size - len(block))
+                if not data:
+                    break
+                block += data
+                if len(block) >= block_size:
+                    yield bytes(block)
+                    block = bytearray()
+    if block:
+        yield bytes(block)
+
+def compress_block(block, method):
+    """Compress a block as a self-contained gzip member or zstd frame."""
+    if method == "gzip":
+        return gzip.compress(block, compresslevel=LEVELS["gzip"], mtime=0)
+    import zstandard
+    return zstandard.ZstdCompressor(level=LEVELS["zstd"]).compress(block)
+
+def write_compressed(fnames, outfile, method, threads):
+    """Compress the input files to the output, overlapping compression with reading."""
+    if method == "zstd":
+        try:
+            import zstandard  # noqa: F401
+        except ImportError:
+            sys.stderr.write("Error: zstd compression requires the zstandard package.\n")
+            return 1
+    # The queue of pending blocks is bounded, so memory use does not depend on the input size.
+    pending = collections.deque()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        for block in iter_blocks(fnames):
+            if len(pending) >= threads * 2:
+                outfile.write(pending.popleft().result())
+            pending.append(executor.submit(compress_block, block, method))
+        while pending:
+            outfile.write(pending.popleft().result())
+    return 0
 
 def main():
     parser = argparse.ArgumentParser(description="Combine multiple text files into one.")
     parser.add_argument("-o", "--output", type=str, help="Output file name")
+    parser.add_argument("-c", "--compress", choices=["none", "gzip", "zstd"], default="none",
+                        help="Output compression (default: none)")
+    parser.add_argument("-t", "--threads", type=int, default=os.cpu_count(),
+                        help="Number of compression and hashing threads (default: number of CPUs)")
+    parser.add_argument("-d", "--dedup", action="store_true", help="Skip files whose content duplicates an earlier file")
     parser.add_argument("inputs", nargs="+", help="Input files to combine")
     args = parser.parse_args()
 
     if args.output:
-        outfile = open(args.output, "w")
+        outfile = open(args.output, "wb")
     else:
-        outfile = sys.stdout
-    for fname in args.inputs:
-        if os.path.isdir(fname):
-            sys.stderr.write(f"Processing directory: {fname}\n")
-            for root, dirs, files in os.walk(fname):
-                for f in files:
-                    copy_file(os.path.join(root, f), outfile)
-        else:
+        sys.stdout.flush()
+        outfile = sys.stdout.buffer
+    fnames = list_inputs(args.inputs)
+    if args.dedup:
+        fnames, duplicates, saved = dedup_inputs(fnames, max(1, args.threads))
+        sys.stderr.write(f"{duplicates} duplicate files skipped, {saved} bytes saved.\n")
+    retVal = 0
+    if args.compress == "none":
+        for fname in fnames:
             copy_file(fname, outfile)
+    else:
+        retVal = write_compressed(fnames, outfile, args.compress, max(1, args.threads))
     if args.output:
         outfile.close()
-    return 0
+    else:
+        outfile.flush()
+    return retVal
 
 if __name__ == "__main__":
     sys.exit(main())
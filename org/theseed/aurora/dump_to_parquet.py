@@ -0,0 +1,268 @@
+#!/usr/local/bin/python3
+# encoding: utf-8
+'''
+org.theseed.aurora.dump_to_parquet -- Convert SOLR dumps to a columnar Parquet cache
+
+org.theseed.aurora.dump_to_parquet is a command that converts the genome.json and genome_feature.json files
+in the subdirectories of one or more SOLR dump directories into a Parquet dataset. The output directory
+contains a "genomes" table and a "features" table, each partitioned by dump subdirectory using Hive-style
+"genome_dir=<subdir>" partition directories, so that it can be read directly with pyarrow.dataset. Use
+query_parquet to count and group the records in the cache.
+
+The cache is updated incrementally. A manifest in the output directory records the size and modification
+time of each converted input file, and only subdirectories whose files have changed are converted again.
+Partitions for subdirectories that are no longer present in the dump are removed.
+
+Every column is stored with a scalar type: list and object values are stored as JSON text, and a column whose
+values have inconsistent types within a partition is stored as text. The unified schema of each table is kept
+in a "<table>.schema" file next to the manifest and is updated as partitions are converted, so queries do not
+have to read the footer of every partition. Where partitions disagree about the type of a column, the unified
+schema uses text, to which the other scalar types are cast when the table is read.
+
+@author:     Bruce Parrello
+
+@copyright:  2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+@contact:    brucep.mobile@gmail.com
+'''
+
+import sys
+import os
+import json
+import shutil
+import functools
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from aurora_utils import iter_json_array, unify_table_schemas, load_table_schema, save_table_schema, PARTITION_KEY
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-19'
+__updated__ = '2026-10-19'
+
+DEBUG = 1
+TESTRUN = 0
+PROFILE = 0
+
+# This maps each input file name to the name of its output table.
+TABLES = {"genome.json": "genomes", "genome_feature.json": "features"}
+
+MANIFEST_NAME = "manifest.json"
+
+class CLIError(Exception):
+    '''Generic exception to raise and log different fatal errors.'''
+    def __init__(self, msg):
+        super(CLIError).__init__(type(self))
+        self.msg = "E: %s" % msg
+    def __str__(self):
+        return self.msg
+    def __unicode__(self):
+        return self.msg
+
+def file_signature(dirpath):
+    ''' Return a dictionary mapping each input file name present in a dump directory to its [size, mtime]. '''
+    retVal = {}
+    for name in TABLES:
+        try:
+            st = os.stat(dirpath + "/" + name)
+            retVal[name] = [st.st_size, st.st_mtime_ns]
+        except FileNotFoundError:
+            pass
+    return retVal
+
+def partition_dir(outpath, table, subdir):
+    ''' Return the partition directory for a subdirectory in an output table. '''
+    return f"{outpath}/{table}/{PARTITION_KEY}={subdir}"
+
+def to_arrow(rows):
+    ''' Convert a list of JSON objects to an Arrow table.
+
+        List and object values are stored as JSON text. If the value types of a column are inconsistent, every
+        non-string value in that column is stored as JSON text; the other columns keep their types.
+    '''
+    columns = {}
+    for row in rows:
+        for k in row:
+            columns.setdefault(k, None)
+    arrays = {}
+    for k in columns:
+        values = [row.get(k) for row in rows]
+        values = [json.dumps(v) if isinstance(v, (list, dict)) else v for v in values]
+        try:
+            arrays[k] = pa.array(values)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays[k] = pa.array([v if isinstance(v, str) or v is None else json.dumps(v) for v in values],
+                                 type=pa.string())
+    return pa.table(arrays)
+
+def convert_dir(dirpath, outpath):
+    ''' Convert the JSON files of a single dump directory to Parquet partitions.
+
+        Returns the subdirectory name, a dictionary of the record counts for each table, and a dictionary of
+        the schemas of the partitions written.
+    '''
+    subdir = os.path.basename(dirpath)
+    counts = {}
+    schemas = {}
+    for name, table in TABLES.items():
+        partdir = partition_dir(outpath, table, subdir)
+        jsonfile = dirpath + "/" + name
+        rows = []
+        if os.path.isfile(jsonfile):
+            with open(jsonfile, "r") as f:
+                rows = [row for row in iter_json_array(f) if isinstance(row, dict)]
+        # Remove the old partition, if any. An empty file produces no partition.
+        if os.path.isdir(partdir):
+            shutil.rmtree(partdir)
+        counts[table] = len(rows)
+        if rows:
+            Path(partdir).mkdir(parents=True, exist_ok=True)
+            tmpfile = partdir + "/part-0.parquet.tmp"
+            arrowTable = to_arrow(rows)
+            pq.write_table(arrowTable, tmpfile, compression="zstd")
+            os.replace(tmpfile, partdir + "/part-0.parquet")
+            schemas[table] = arrowTable.schema
+    return subdir, counts, schemas
+
+def load_manifest(outpath):
+    ''' Return the manifest for the cache, or an empty manifest if there is none. '''
+    manifest_file = outpath + "/" + MANIFEST_NAME
+    if not os.path.isfile(manifest_file):
+        return {}
+    with open(manifest_file, "r") as f:
+        return json.load(f)
+
+def save_manifest(outpath, manifest):
+    ''' Write the manifest for the cache, replacing the old one atomically. '''
+    manifest_file = outpath + "/" + MANIFEST_NAME
+    with open(manifest_file + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(manifest_file + ".tmp", manifest_file)
+
+def main(argv=None): # IGNORE:C0111
+    '''Command line options.'''
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+  Created by Bruce Parrello on %s.
+  Copyright 2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+  Licensed under the Apache License 2.0
+  http://www.apache.org/licenses/LICENSE-2.0
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+''' % (program_shortdesc, str(__date__))
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
+        parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=os.cpu_count(), help="number of parallel conversion processes [default: %(default)s]")
+        parser.add_argument(dest="outpath", help="path to Parquet cache folder", metavar="outpath")
+        parser.add_argument(dest="paths", help="paths to SOLR dump folder(s)", metavar="path", nargs='+')
+
+        # Process arguments
+        args = parser.parse_args()
+
+        outpath = args.outpath
+        paths = args.paths
+        verbose = args.verbose
+
+        if verbose > 0:
+            print("Verbose mode on")
+        Path(outpath).mkdir(parents=True, exist_ok=True)
+        manifest = load_manifest(outpath)
+        # Find the subdirectories whose files have changed since the last conversion.
+        dirsIn = 0
+        signatures = {}
+        changed = []
+        for inpath in paths:
+            for f in os.scandir(inpath):
+                if f.is_dir():
+                    dirsIn += 1
+                    if f.name in signatures:
+                        raise CLIError(f"Subdirectory name {f.name} occurs in more than one dump.")
+                    signature = file_signature(f.path)
+                    signatures[f.name] = signature
+                    if manifest.get(f.name) != signature:
+                        changed.append(inpath + "/" + f.name)
+        # Remove the partitions for subdirectories that have disappeared.
+        removed = [subdir for subdir in manifest if subdir not in signatures]
+        for subdir in removed:
+            for table in TABLES.values():
+                partdir = partition_dir(outpath, table, subdir)
+                if os.path.isdir(partdir):
+                    shutil.rmtree(partdir)
+            del manifest[subdir]
+        print(f"{dirsIn} directories found, {len(changed)} to convert, {len(removed)} removed.")
+        # Convert the changed directories.
+        totals = {table: 0 for table in TABLES.values()}
+        tableSchemas = {table: load_table_schema(outpath + "/" + table) for table in TABLES.values()}
+        converter = functools.partial(convert_dir, outpath=outpath)
+        try:
+            with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+                for subdir, counts, schemas in executor.map(converter, changed, chunksize=4):
+                    manifest[subdir] = signatures[subdir]
+                    for table, count in counts.items():
+                        totals[table] += count
+                    for table, schema in schemas.items():
+                        tableSchemas[table] = unify_table_schemas([tableSchemas[table], schema])
+                    if verbose > 1:
+                        print(f"{subdir} converted.")
+        finally:
+            # Whatever finished is recorded, so an interrupted run can be resumed. The schemas are saved
+            # first, so every partition in the manifest is covered by them.
+            for table, schema in tableSchemas.items():
+                if schema is not None:
+                    save_table_schema(outpath + "/" + table, schema)
+            save_manifest(outpath, manifest)
+        print(f"{len(changed)} directories converted: {totals['genomes']} genomes and {totals['features']} features.")
+        return 0
+    except KeyboardInterrupt:
+        ### handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TESTRUN:
+            raise(e)
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+if __name__ == "__main__":
+    if DEBUG:
+        sys.argv.append("-v")
+    if TESTRUN:
+        import doctest
+        doctest.testmod()
+    if PROFILE:
+        import cProfile
+        import pstats
+        profile_filename = 'org.theseed.aurora.dump_to_parquet_profile.txt'
+        cProfile.run('main()', profile_filename)
+        statsfile = open("profile_stats.txt", "wb")
+        p = pstats.Stats(profile_filename, stream=statsfile)
+        stats = p.strip_dirs().sort_stats('cumulative')
+        stats.print_stats()
+        statsfile.close()
+        sys.exit(0)
+    sys.exit(main())
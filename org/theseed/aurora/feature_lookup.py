@@ -0,0 +1,207 @@
+#!/usr/local/bin/python3
+# encoding: utf-8
+'''
+org.theseed.aurora.feature_lookup -- Retrieve features from a random-access feature store
+
+org.theseed.aurora.feature_lookup is a command that retrieves feature records from the store created by
+build_feature_store. The input is a list of feature IDs, one per line. If --genome is specified, the input is
+instead a list of genome dump subdirectory names, and all the features for each genome are retrieved. The
+records are written to the standard output as JSON Lines, exactly as they are stored.
+
+A batch of feature IDs is resolved with a single vectorized binary search of the memory-mapped index, and the
+records are then read in file order, with one seek per record.
+
+@author:     Bruce Parrello
+
+@copyright:  2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+@contact:    brucep.mobile@gmail.com
+'''
+
+import sys
+import os
+import json
+import struct
+import numpy as np
+
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+from aurora_utils import read_batches, fid_hash
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-19'
+__updated__ = '2026-10-19'
+
+DEBUG = 1
+TESTRUN = 0
+PROFILE = 0
+
+LENGTH = struct.Struct("<I")
+
+class CLIError(Exception):
+    '''Generic exception to raise and log different fatal errors.'''
+    def __init__(self, msg):
+        super(CLIError).__init__(type(self))
+        self.msg = "E: %s" % msg
+    def __str__(self):
+        return self.msg
+    def __unicode__(self):
+        return self.msg
+
+def read_record(fd, offset):
+    ''' Return the record bytes at the specified offset in the record file. '''
+    header = os.pread(fd, LENGTH.size, offset)
+    return os.pread(fd, LENGTH.unpack(header)[0], offset + LENGTH.size)
+
+def lookup_fids(fd, keys, offsets, key_field, fids):
+    ''' Find the records for a batch of feature IDs.
+
+        Returns a dictionary mapping each feature ID found to its record bytes. Hash collisions are resolved
+        by checking the ID in each candidate record.
+    '''
+    hashes = np.array([fid_hash(fid) for fid in fids], dtype=np.uint64)
+    left = np.searchsorted(keys, hashes, side="left")
+    right = np.searchsorted(keys, hashes, side="right")
+    candidates = []
+    for fid, lo, hi in zip(fids, left, right):
+        for i in range(lo, hi):
+            candidates.append((int(offsets[i]), fid))
+    # Reading in file order turns the seeks into a forward sweep.
+    candidates.sort()
+    retVal = {}
+    for offset, fid in candidates:
+        if fid not in retVal:
+            record = read_record(fd, offset)
+            if json.loads(record).get(key_field) == fid:
+                retVal[fid] = record
+    return retVal
+
+def load_genomes(store):
+    ''' Return a dictionary mapping each genome subdirectory name to its first record offset and count. '''
+    retVal = {}
+    with open(store + "/genomes.tsv", "r") as f:
+        for line in f:
+            subdir, offset, count = line.rstrip("\n").split("\t")
+            retVal[subdir] = (int(offset), int(count))
+    return retVal
+
+def main(argv=None): # IGNORE:C0111
+    '''Command line options.'''
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+  Created by Bruce Parrello on %s.
+  Copyright 2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+  Licensed under the Apache License 2.0
+  http://www.apache.org/licenses/LICENSE-2.0
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+''' % (program_shortdesc, str(__date__))
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
+        parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-g", "--genome", dest="genome", action="store_true", help="input IDs are genome subdirectory names")
+        parser.add_argument("-b", "--batch", dest="batch", type=int, default=10000, help="number of IDs per lookup batch [default: %(default)s]")
+        parser.add_argument(dest="store", help="path to feature store folder", metavar="store")
+        parser.add_argument(dest="inFile", help="file of IDs to retrieve, one per line (- for the standard input) [default: %(default)s]", metavar="inFile", nargs="?", default="-")
+
+        # Process arguments
+        args = parser.parse_args()
+
+        store = args.store
+        verbose = args.verbose
+
+        if verbose > 0:
+            print("Verbose mode on", file=sys.stderr)
+        if not os.path.isfile(store + "/store.json"):
+            raise CLIError(f"{store} is not a feature store.")
+        with open(store + "/store.json", "r") as f:
+            key_field = json.load(f)["key"]
+        out = sys.stdout.buffer
+        inStream = sys.stdin if args.inFile == "-" else open(args.inFile, "r")
+        fd = os.open(store + "/features.dat", os.O_RDONLY)
+        keysIn = 0
+        found = 0
+        recordsOut = 0
+        try:
+            if args.genome:
+                genomes = load_genomes(store)
+                with os.fdopen(os.dup(fd), "rb") as dataStream:
+                    for keys in read_batches(inStream, args.batch):
+                        for subdir in keys:
+                            keysIn += 1
+                            if subdir in genomes:
+                                found += 1
+                                offset, count = genomes[subdir]
+                                # The genome's records are contiguous, so one seek reads them all.
+                                dataStream.seek(offset)
+                                for _ in range(count):
+                                    length = LENGTH.unpack(dataStream.read(LENGTH.size))[0]
+                                    out.write(dataStream.read(length) + b"\n")
+                                    recordsOut += 1
+            else:
+                # The index arrays are memory-mapped, so only the pages touched by the searches are read.
+                keys = np.load(store + "/fid_keys.npy", mmap_mode="r")
+                offsets = np.load(store + "/fid_offsets.npy", mmap_mode="r")
+                for fids in read_batches(inStream, args.batch):
+                    keysIn += len(fids)
+                    records = lookup_fids(fd, keys, offsets, key_field, fids)
+                    for fid in fids:
+                        if fid in records:
+                            found += 1
+                            out.write(records[fid] + b"\n")
+                            recordsOut += 1
+        finally:
+            os.close(fd)
+            if inStream is not sys.stdin:
+                inStream.close()
+        out.flush()
+        print(f"{keysIn} IDs read, {found} found, {recordsOut} records written.", file=sys.stderr)
+        return 0
+    except KeyboardInterrupt:
+        ### handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TESTRUN:
+            raise(e)
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+if __name__ == "__main__":
+    if DEBUG:
+        sys.argv.append("-v")
+    if TESTRUN:
+        import doctest
+        doctest.testmod()
+    if PROFILE:
+        import cProfile
+        import pstats
+        profile_filename = 'org.theseed.aurora.feature_lookup_profile.txt'
+        cProfile.run('main()', profile_filename)
+        statsfile = open("profile_stats.txt", "wb")
+        p = pstats.Stats(profile_filename, stream=statsfile)
+        stats = p.strip_dirs().sort_stats('cumulative')
+        stats.print_stats()
+        statsfile.close()
+        sys.exit(0)
+    sys.exit(main())
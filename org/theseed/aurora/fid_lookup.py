@@ -0,0 +1,159 @@
+#!/usr/local/bin/python3
+# encoding: utf-8
+'''
+org.theseed.aurora.fid_lookup -- Resolve FIG IDs and aliases using a feature lookup index
+
+org.theseed.aurora.fid_lookup reads a list of FIG IDs and/or aliases, one per line, and looks them up in
+the SQLite database created by build_fid_index. The IDs are resolved in batches. For each ID found, the
+output contains the input ID, the FIG ID, the genome ID, the feature type and the location, tab-delimited.
+An alias that belongs to more than one feature produces one output line per feature.
+
+@author:     Bruce Parrello
+
+@copyright:  2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+@contact:    brucep.mobile@gmail.com
+'''
+
+import sys
+import os
+import sqlite3
+
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+from aurora_utils import read_batches
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-19'
+__updated__ = '2026-10-19'
+
+DEBUG = 1
+TESTRUN = 0
+PROFILE = 0
+
+class CLIError(Exception):
+    '''Generic exception to raise and log different fatal errors.'''
+    def __init__(self, msg):
+        super(CLIError).__init__(type(self))
+        self.msg = "E: %s" % msg
+    def __str__(self):
+        return self.msg
+    def __unicode__(self):
+        return self.msg
+
+def lookup_batch(conn, keys):
+    ''' Resolve a batch of IDs.
+
+        Returns a dictionary mapping each ID found to a list of (fid, genome, type, location) tuples. FIG IDs
+        are tried first, and only the IDs that are not FIG IDs are looked up as aliases.
+    '''
+    retVal = {}
+    marks = ",".join("?" * len(keys))
+    for row in conn.execute(f"SELECT fid, genome, type, location FROM features WHERE fid IN ({marks})", keys):
+        retVal[row[0]] = [row]
+    remaining = [key for key in keys if key not in retVal]
+    if remaining:
+        marks = ",".join("?" * len(remaining))
+        query = ("SELECT a.alias, f.fid, f.genome, f.type, f.location FROM aliases a "
+                 f"JOIN features f ON f.fid = a.fid WHERE a.alias IN ({marks})")
+        for row in conn.execute(query, remaining):
+            retVal.setdefault(row[0], []).append(row[1:])
+    return retVal
+
+def main(argv=None): # IGNORE:C0111
+    '''Command line options.'''
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+  Created by Bruce Parrello on %s.
+  Copyright 2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+  Licensed under the Apache License 2.0
+  http://www.apache.org/licenses/LICENSE-2.0
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+''' % (program_shortdesc, str(__date__))
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
+        parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-b", "--batch", dest="batch", type=int, default=500, help="number of IDs per query batch [default: %(default)s]")
+        parser.add_argument(dest="dbfile", help="path to SQLite database built by build_fid_index", metavar="dbfile")
+        parser.add_argument(dest="inFile", help="file of IDs to resolve, one per line (- for the standard input) [default: %(default)s]", metavar="inFile", nargs="?", default="-")
+
+        # Process arguments
+        args = parser.parse_args()
+
+        dbfile = args.dbfile
+        verbose = args.verbose
+
+        if verbose > 0:
+            print("Verbose mode on", file=sys.stderr)
+        if not os.path.isfile(dbfile):
+            raise CLIError(f"Database {dbfile} does not exist.")
+        conn = sqlite3.connect(f"file:{dbfile}?mode=ro", uri=True)
+        inStream = sys.stdin if args.inFile == "-" else open(args.inFile, "r")
+        keysIn = 0
+        found = 0
+        try:
+            print("id\tfid\tgenome\ttype\tlocation")
+            for keys in read_batches(inStream, args.batch):
+                keysIn += len(keys)
+                results = lookup_batch(conn, keys)
+                for key in keys:
+                    rows = results.get(key)
+                    if rows:
+                        found += 1
+                        for row in rows:
+                            print(key + "\t" + "\t".join(row))
+        finally:
+            if inStream is not sys.stdin:
+                inStream.close()
+            conn.close()
+        print(f"{keysIn} IDs read, {found} found, {keysIn - found} not found.", file=sys.stderr)
+        return 0
+    except KeyboardInterrupt:
+        ### handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TESTRUN:
+            raise(e)
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+if __name__ == "__main__":
+    if DEBUG:
+        sys.argv.append("-v")
+    if TESTRUN:
+        import doctest
+        doctest.testmod()
+    if PROFILE:
+        import cProfile
+        import pstats
+        profile_filename = 'org.theseed.aurora.fid_lookup_profile.txt'
+        cProfile.run('main()', profile_filename)
+        statsfile = open("profile_stats.txt", "wb")
+        p = pstats.Stats(profile_filename, stream=statsfile)
+        stats = p.strip_dirs().sort_stats('cumulative')
+        stats.print_stats()
+        statsfile.close()
+        sys.exit(0)
+    sys.exit(main())
@@ -7,6 +7,24 @@ org.theseed.aurora.merge_tests is a command-line utility that takes multiple MCQ
 JSON files into a single output JSON. Each subdirectory of the input directory should contain a single JSON
 file, and these will all be merged into a single output JSON file.
 
+The input files are parsed one question at a time, so memory use does not depend on the size of the runs.
+If --jsonl is specified, the output is written as JSON Lines, one question per line, instead of as a JSON
+list.
+
+If --dedup is specified, duplicate questions are removed. The question and answer text (selected by
+--dedup-fields) is normalized to lower case with the punctuation and extra spaces removed, and a 64-bit digest
+of the result is kept for each question written in a compact hash table. If --near is specified, a MinHash signature of the word
+trigrams in the normalized text is also computed, and a question whose estimated similarity to a previous
+question meets the --near threshold is treated as a duplicate. The duplicate ratio for each run is reported
+at the end. Use --threads to read and parse the input files in a pool of threads; the number of files held in
+memory at one time is limited to the number of threads.
+
+If --shards is specified, the questions are distributed round-robin over that many JSON Lines shard files,
+named <base>.000.jsonl, <base>.001.jsonl and so on, where <base> is the target name without its extension.
+An index file <base>.idx records the shard number and byte offset of every question in output order, so any
+question can be read with a single seek. The read_questions function in this module uses the index to read
+questions by number.
+
 @author:     Bruce Parrello
 
 @copyright:  2025 Fellowship for Interpretation of Genomes
@@ -16,20 +34,38 @@ file, and these will all be merged into a single output JSON file.
 
 import sys
 import os
+import re
 import json
+import random
+import struct
+import contextlib
+import itertools
 
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from aurora_utils import iter_json_array, fid_hash
 
 __all__ = []
 __version__ = 0.1
 __date__ = '2024-07-19'
-__updated__ = '2024-07-19'
+__updated__ = '2026-10-19'
 
 DEBUG = 1
 TESTRUN = 0
 PROFILE = 0
 
+NON_WORD = re.compile(r'[\W_]+')
+
+# This is the Mersenne prime used for the MinHash permutations.
+MINHASH_PRIME = (1 << 61) - 1
+
+# The shard index header contains a magic string, the shard count, and the question count.
+INDEX_HEADER = struct.Struct("<8sIQ")
+INDEX_MAGIC = b"MCQIDX01"
+
 class CLIError(Exception):
     '''Generic exception to raise and log different fatal errors.'''
     def __init__(self, msg):
@@ -40,6 +76,215 @@ class CLIError(Exception):
     def __unicode__(self):
         return self.msg
 
+def stream_file(inFile):
+    ''' Yield the questions in an MCQ run file one at a time. '''
+    with open(inFile) as inStream:
+        yield from iter_json_array(inStream)
+
+def load_file(inFile):
+    ''' Return a list of the questions in an MCQ run file. '''
+    return list(stream_file(inFile))
+
+def iter_file_records(inFiles, threads):
+    ''' Yield each file name in the list with an iterable of its questions, in order.
+
+        If threads is greater than 1, the files are loaded ahead in a thread pool, with no more than that many
+        files pending at once. Otherwise, each file is streamed when it is reached.
+    '''
+    if threads <= 1:
+        for inFile in inFiles:
+            yield inFile, stream_file(inFile)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            files = iter(inFiles)
+            pending = deque((inFile, executor.submit(load_file, inFile)) for inFile in itertools.islice(files, threads))
+            while pending:
+                inFile, future = pending.popleft()
+                nextFile = next(files, None)
+                if nextFile is not None:
+                    pending.append((nextFile, executor.submit(load_file, nextFile)))
+                yield inFile, future.result()
+
+def normalize_text(value):
+    ''' Return normalized text for a question field: lower case, with punctuation and extra spaces removed. '''
+    if not isinstance(value, str):
+        value = json.dumps(value, sort_keys=True)
+    return NON_WORD.sub(" ", value.lower()).strip()
+
+def question_text(record, fields):
+    ''' Return the normalized text used to compare a question with others.
+
+        This is the normalized text of the specified fields. If the record has none of the fields, the whole
+        record is used.
+    '''
+    if isinstance(record, dict) and any(field in record for field in fields):
+        return "\t".join(normalize_text(record.get(field, "")) for field in fields)
+    return normalize_text(record)
+
+class DigestSet:
+    ''' This object is a set of 64-bit digests kept in an open-addressing hash table.
+
+        The table is a flat array of unsigned 64-bit integers that is kept between a quarter and a half full, so
+        each digest costs 16 to 32 bytes, against about 70 in a set of Python integers. Zero marks an empty
+        slot, so a digest of zero is stored as one.
+    '''
+
+    def __init__(self, capacity=1024):
+        self.table = array('Q', bytes(8 * capacity))
+        self.count = 0
+
+    def _find(self, digest):
+        ''' Return the slot holding a digest, or the empty slot where it belongs. '''
+        table = self.table
+        mask = len(table) - 1
+        i = digest & mask
+        while table[i] and table[i] != digest:
+            i = (i + 1) & mask
+        return i
+
+    def __contains__(self, digest):
+        return self.table[self._find(digest or 1)] != 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, digest):
+        digest = digest or 1
+        i = self._find(digest)
+        if not self.table[i]:
+            self.table[i] = digest
+            self.count += 1
+            if self.count * 2 > len(self.table):
+                old = self.table
+                self.table = array('Q', bytes(16 * len(old)))
+                for value in old:
+                    if value:
+                        self.table[self._find(value)] = value
+
+class NearDuplicateIndex:
+    ''' This object finds near-duplicate texts using MinHash signatures and locality-sensitive hashing.
+
+        Each signature is divided into bands, and two texts are compared only if they agree on every value in
+        at least one band. A text is a near duplicate if the fraction of matching signature values for some
+        earlier text meets the threshold. The signatures are stored end to end in a single array of unsigned
+        64-bit integers, and each band is keyed in the buckets by the hash of its values.
+    '''
+
+    def __init__(self, threshold, num_perm=64, bands=16):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.rows = num_perm // bands
+        self.bands = bands
+        # The permutations are fixed so that runs are reproducible.
+        rand = random.Random(42)
+        self.perms = [(rand.randrange(1, MINHASH_PRIME), rand.randrange(0, MINHASH_PRIME)) for _ in range(num_perm)]
+        # Each bucket holds a single signature index, or a list of them if several texts share the band.
+        self.buckets = {}
+        self.signatures = array('Q')
+
+    def signature(self, text):
+        ''' Return the MinHash signature of the word trigrams in a text. '''
+        words = text.split()
+        if len(words) < 3:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i+3]) for i in range(len(words) - 2)}
+        hashes = [fid_hash(shingle) for shingle in shingles]
+        return array('Q', [min((a * h + b) % MINHASH_PRIME for h in hashes) for a, b in self.perms])
+
+    def check_and_add(self, text):
+        ''' Return TRUE if the text is a near duplicate of an earlier text; otherwise, add it to the index. '''
+        sig = self.signature(text)
+        keys = [hash((band,) + tuple(sig[band * self.rows:(band + 1) * self.rows])) for band in range(self.bands)]
+        needed = self.threshold * self.num_perm
+        checked = set()
+        for key in keys:
+            entry = self.buckets.get(key)
+            if entry is None:
+                continue
+            for idx in (entry if isinstance(entry, list) else (entry,)):
+                if idx not in checked:
+                    checked.add(idx)
+                    start = idx * self.num_perm
+                    other = self.signatures[start:start + self.num_perm]
+                    matches = sum(1 for x, y in zip(sig, other) if x == y)
+                    if matches >= needed:
+                        return True
+        idx = len(self.signatures) // self.num_perm
+        self.signatures.extend(sig)
+        for key in keys:
+            entry = self.buckets.get(key)
+            if entry is None:
+                self.buckets[key] = idx
+            elif isinstance(entry, list):
+                entry.append(idx)
+            else:
+                self.buckets[key] = [entry, idx]
+        return False
+
+def shard_base(target):
+    ''' Return the base name for the shard and index files of a target file. '''
+    return os.path.splitext(target)[0]
+
+def shard_name(target, shard):
+    ''' Return the name of a shard file for a target file. '''
+    return f"{shard_base(target)}.{shard:03d}.jsonl"
+
+class ShardWriter:
+    ''' This object writes questions round-robin to JSON Lines shard files and builds the offset index. '''
+
+    def __init__(self, target, shards):
+        self.target = target
+        self.streams = [open(shard_name(target, i), "wb") for i in range(shards)]
+        self.sizes = [0] * shards
+        self.shard_ids = array('H')
+        self.offsets = array('Q')
+
+    def write(self, record):
+        shard = len(self.offsets) % len(self.streams)
+        data = (json.dumps(record) + "\n").encode("utf-8")
+        self.shard_ids.append(shard)
+        self.offsets.append(self.sizes[shard])
+        self.streams[shard].write(data)
+        self.sizes[shard] += len(data)
+
+    def close(self):
+        ''' Close the shard files and write the index. '''
+        for stream in self.streams:
+            stream.close()
+        with open(shard_base(self.target) + ".idx", "wb") as indexStream:
+            indexStream.write(INDEX_HEADER.pack(INDEX_MAGIC, len(self.streams), len(self.offsets)))
+            self.shard_ids.tofile(indexStream)
+            self.offsets.tofile(indexStream)
+
+def load_index(target):
+    ''' Return the shard count, the shard number array, and the offset array from a target's shard index. '''
+    with open(shard_base(target) + ".idx", "rb") as indexStream:
+        magic, shards, count = INDEX_HEADER.unpack(indexStream.read(INDEX_HEADER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{shard_base(target)}.idx is not a question shard index.")
+        shard_ids = array('H')
+        shard_ids.fromfile(indexStream, count)
+        offsets = array('Q')
+        offsets.fromfile(indexStream, count)
+    return shards, shard_ids, offsets
+
+def read_questions(target, numbers, index=None):
+    ''' Return the questions with the specified output numbers (0-based) from a sharded merge.
+
+        The index from load_index can be passed in to avoid reloading it for every call. The questions are
+        read in shard and offset order, and returned in the order of the numbers.
+    '''
+    shards, shard_ids, offsets = index or load_index(target)
+    retVal = {}
+    requests = sorted((shard_ids[n], offsets[n], n) for n in set(numbers))
+    for shard, group in itertools.groupby(requests, key=lambda x: x[0]):
+        with open(shard_name(target, shard), "rb") as shardStream:
+            for _, offset, n in group:
+                shardStream.seek(offset)
+                retVal[n] = json.loads(shardStream.readline())
+    return [retVal[n] for n in numbers]
+
 def main(argv=None): # IGNORE:C0111
     '''source is the source directory, target is the destination file.'''
 
@@ -72,12 +317,21 @@ USAGE
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
         parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("--jsonl", dest="jsonl", action="store_true", help="write the output as JSON Lines")
+        parser.add_argument("--dedup", dest="dedup", action="store_true", help="remove duplicate questions")
+        parser.add_argument("--dedup-fields", dest="dedup_fields", default="question,answer", help="comma-delimited list of fields compared for deduplication [default: %(default)s]")
+        parser.add_argument("--near", dest="near", type=float, help="similarity threshold (0 to 1) for near-duplicate removal")
+        parser.add_argument("--shards", dest="shards", type=int, help="number of JSON Lines shard files to write, with an offset index")
+        parser.add_argument("-t", "--threads", dest="threads", type=int, default=1, help="number of file reader threads [default: %(default)s]")
         parser.add_argument(dest="source", help="path to source folder [default: %(default)s]", metavar="source", default="testSets")
         parser.add_argument(dest="target", help="path to new target file [default: %(default)s]", metavar="target", default="allTests.json")
 
         # Process arguments
         args = parser.parse_args()
 
+        if args.near is not None and not 0.0 <= args.near <= 1.0:
+            parser.error("--near must be between 0 and 1.")
+
         source = args.source
         target = args.target
         verbose = args.verbose
@@ -90,32 +344,78 @@ USAGE
 
         inDirs = os.listdir(source)
         print(f"{len(inDirs)} sub-directories found in directory {source}.")
-        print(f"Output will be to {target}.")
+        if args.shards:
+            print(f"Output will be to {args.shards} shards named {shard_name(target, 0)} and so on.")
+        else:
+            print(f"Output will be to {target}.")
+        dedup = args.dedup or args.near is not None
+        dedup_fields = [field.strip() for field in args.dedup_fields.split(",") if field.strip()]
+        digests = DigestSet()
+        nearIndex = NearDuplicateIndex(args.near) if args.near is not None else None
+        # Collect the input files, remembering the run (sub-directory) for each.
+        inFiles = []
+        fileRuns = {}
+        for inBase in inDirs:
+            inDir = os.path.join(source, inBase)
+            if os.path.isdir(inDir):
+                for inFileName in [f for f in os.listdir(inDir) if f.endswith(".json")]:
+                    inFile = os.path.join(inDir, inFileName)
+                    if os.path.isfile(inFile):
+                        inFiles.append(inFile)
+                        fileRuns[inFile] = inBase
+        # This will map each run to its question and duplicate counts.
+        runCounts = {}
         linesOut = 0
         # The initial delimiter will be a left bracket. After that, a comma.
         delim = "["
-        with open(target, "w") as outStream:
-            for inBase in inDirs:
-                inDir = os.path.join(source, inBase)
-                if os.path.isdir(inDir):
-                    inFiles = [f for f in os.listdir(inDir) if f.endswith(".json")]
-                    for inFileName in inFiles:
-                        inFile = os.path.join(inDir, inFileName)
-                        if os.path.isfile(inFile):
-                            print(f"Scanning file {inFile}.")
-                            with open(inFile) as inStream:
-                                mcqList = json.load(inStream)
-                                print(f"{len(mcqList)} records read.")
-                                # Write the questions to the output.
-                                for line in mcqList:
-                                    outStream.write(delim + "\n")
-                                    outStream.write("    " + json.dumps(line))
-                                    delim = ","
-                                    linesOut += 1
+        shardWriter = ShardWriter(target, args.shards) if args.shards else None
+        # In sharded mode, there is no single output stream.
+        with (contextlib.nullcontext() if shardWriter else open(target, "w")) as outStream:
+            for inFile, records in iter_file_records(inFiles, args.threads):
+                print(f"Scanning file {inFile}.")
+                recordsIn = 0
+                dupsIn = 0
+                # Write the questions to the output as they are read.
+                for line in records:
+                    recordsIn += 1
+                    if dedup:
+                        text = question_text(line, dedup_fields)
+                        digest = fid_hash(text)
+                        if digest in digests or (nearIndex is not None and nearIndex.check_and_add(text)):
+                            dupsIn += 1
+                            continue
+                        digests.add(digest)
+                    if shardWriter:
+                        shardWriter.write(line)
+                    elif args.jsonl:
+                        outStream.write(json.dumps(line) + "\n")
+                    else:
+                        outStream.write(delim + "\n")
+                        outStream.write("    " + json.dumps(line))
+                        delim = ","
+                    linesOut += 1
+                print(f"{recordsIn} records read.")
+                counts = runCounts.setdefault(fileRuns[inFile], [0, 0])
+                counts[0] += recordsIn
+                counts[1] += dupsIn
             # Finish the output.
-            outStream.write("\n]\n")
-            outStream.flush()
+            if shardWriter:
+                shardWriter.close()
+            elif not args.jsonl:
+                outStream.write("\n]\n")
+            if outStream:
+                outStream.flush()
             print(f"{linesOut} total questions written.")
+        if dedup:
+            totalIn = 0
+            totalDups = 0
+            for run, (recordsIn, dupsIn) in runCounts.items():
+                ratio = (dupsIn / recordsIn) if recordsIn else 0.0
+                print(f"{run}: {recordsIn} questions, {dupsIn} duplicates ({ratio:.1%}).")
+                totalIn += recordsIn
+                totalDups += dupsIn
+            ratio = (totalDups / totalIn) if totalIn else 0.0
+            print(f"{totalDups} duplicates removed from {totalIn} questions ({ratio:.1%}).")
         return 0
     except KeyboardInterrupt:
         print("Interrupted!")
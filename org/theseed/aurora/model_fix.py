@@ -6,6 +6,25 @@ org.theseed.aurora.model_fix -- Fix FIG IDs in a model seed dump
 org.theseed.aurora.model_fix is a command-line utility that fixes the problem with modelseed dumps replacing
 the vertical bar in a FIG ID with " or ".
 
+Other defects can be fixed in the same pass by specifying a rules file with --rules. Each line of the rules
+file contains a rule type ("literal" or "regex"), a pattern, and a replacement, tab-delimited. Blank lines
+and lines beginning with "#" are ignored. A regex replacement can refer to the pattern's groups in the usual
+way, and the pattern itself can use backreferences. The regexes are applied in multi-line mode, so "^" and "$"
+match at line boundaries. Inline flags must be scoped, as in "(?i:...)", and group names beginning with "r"
+followed by a digit, or the name "lit", are reserved. If no rules file is specified, the single rule replacing "fig or " with "fig|" is used. All the rules are
+compiled into a single pattern, so each file is scanned once. The literals are arranged as a trie, so their cost
+grows much more slowly than their number, but the regexes are alternatives that are tried one after another at
+each position, so the scan time grows in proportion to the number of regex rules. Large rule sets should use
+literals wherever possible. Where two rules match at the same place, the longest literal wins, and
+literals win over regexes. The number of hits for each rule is reported at the end.
+
+The files are rewritten as binary streams in fixed-size chunks, so memory use does not depend on the file
+size. A match that spans two chunks is handled by holding back the end of each chunk until the next one is
+read. With regex rules, the chunks are divided at line ends where possible, so a regex match must not span
+lines. A regex match is also assumed to be no longer than the --max-match limit, which bounds the amount held
+back when a line is very long or there are no line ends at all. Use --jobs to fix several files at once in a
+process pool.
+
 @author:     Bruce Parrello
 
 @copyright:  2024 Fellowship for Interpretation of Genomes
@@ -15,19 +34,37 @@ the vertical bar in a FIG ID with " or ".
 
 import sys
 import os
+import re
+import functools
 
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
 
 __all__ = []
 __version__ = 0.1
 __date__ = '2024-07-19'
-__updated__ = '2024-07-19'
+__updated__ = '2026-10-19'
 
 DEBUG = 1
 TESTRUN = 0
 PROFILE = 0
 
+CHUNK_SIZE = 4 * 1024 * 1024
+
+MAX_MATCH = 64 * 1024
+
+# These are used to rewrite the group references in a regex rule.
+GROUP_REF = re.compile(r'\\([1-9][0-9]?)')
+OCTAL_ESCAPE = re.compile(r'\\[0-7]{3}')
+CONDITION_REF = re.compile(r'\(\?\((\d+)\)')
+NAMED_GROUP = re.compile(r'\(\?P<(\w+)>')
+TEMPLATE_REF = re.compile(r'\\(?:([1-9][0-9]?)|g<(\d+)>)')
+TEMPLATE_NAME = re.compile(r'\\g<(\w*[^\d>]\w*)>')
+RESERVED_NAME = re.compile(r'lit$|r\d')
+
+DEFAULT_RULES = [("literal", "fig or ", "fig|")]
+
 class CLIError(Exception):
     '''Generic exception to raise and log different fatal errors.'''
     def __init__(self, msg):
@@ -38,6 +75,252 @@ class CLIError(Exception):
     def __unicode__(self):
         return self.msg
 
+def trie_pattern(literals):
+    ''' Return a regex pattern that matches any of a set of byte-string literals.
+
+        The literals are arranged in a trie, so the matching cost does not depend on how many there are.
+        At each position, the longest matching literal is preferred.
+    '''
+    trie = {}
+    for literal in literals:
+        node = trie
+        for byte in literal:
+            node = node.setdefault(byte, {})
+        # The None key marks the end of a literal.
+        node[None] = True
+    return trie_node_pattern(trie)
+
+def trie_node_pattern(node):
+    ''' Return the regex pattern for a node of a literal trie. '''
+    alternatives = [re.escape(bytes([byte])) + trie_node_pattern(child)
+                    for byte, child in sorted((k, v) for k, v in node.items() if k is not None)]
+    if not alternatives:
+        return b""
+    retVal = alternatives[0] if len(alternatives) == 1 else b"(?:" + b"|".join(alternatives) + b")"
+    if None in node:
+        # A literal ends here, but a longer one is tried first.
+        retVal = b"(?:" + retVal + b")?"
+    return retVal
+
+def rename_groups(pattern, prefix):
+    ''' Rewrite a regex pattern so that its groups are referenced by name.
+
+        Each unnamed capturing group is given a name consisting of the prefix and the group number, and each
+        numeric backreference is changed to refer to its group by name, so the pattern can be embedded in a
+        larger one. Returns the new pattern and a dictionary mapping each group number to its name.
+    '''
+    parts = []
+    names = {}
+    inClass = False
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            # Inside a character class, a numeric escape is a character, not a reference.
+            m = None if inClass or OCTAL_ESCAPE.match(pattern, i) else GROUP_REF.match(pattern, i)
+            if m and int(m.group(1)) in names:
+                parts.append(f"(?P={names[int(m.group(1))]})")
+                i = m.end()
+            else:
+                parts.append(pattern[i:i + 2])
+                i += 2
+        elif inClass:
+            inClass = (c != "]")
+            parts.append(c)
+            i += 1
+        elif c == "[":
+            # A "]" immediately after the opening bracket is part of the class.
+            j = i + 1
+            if pattern.startswith("^", j):
+                j += 1
+            if pattern.startswith("]", j):
+                j += 1
+            parts.append(pattern[i:j])
+            inClass = True
+            i = j
+        elif c == "(":
+            m = NAMED_GROUP.match(pattern, i) or CONDITION_REF.match(pattern, i)
+            if pattern.startswith("(?#", i):
+                # Comments can contain anything but a closing parenthesis.
+                j = pattern.find(")", i)
+                j = len(pattern) if j < 0 else j + 1
+                parts.append(pattern[i:j])
+                i = j
+            elif m and m.re is NAMED_GROUP:
+                names[len(names) + 1] = m.group(1)
+                parts.append(m.group())
+                i = m.end()
+            elif m and int(m.group(1)) in names:
+                parts.append(f"(?({names[int(m.group(1))]})")
+                i = m.end()
+            elif pattern.startswith("(?", i):
+                parts.append("(?")
+                i += 2
+            else:
+                names[len(names) + 1] = f"{prefix}{len(names) + 1}"
+                parts.append(f"(?P<{names[len(names)]}>")
+                i += 1
+        else:
+            parts.append(c)
+            i += 1
+    return "".join(parts), names
+
+def rename_template(template, names):
+    ''' Rewrite a regex replacement template so that it refers to groups by the names from rename_groups.
+
+        A reference to a group that does not exist raises a ValueError.
+    '''
+    parts = []
+    i = 0
+    while i < len(template):
+        m = None if OCTAL_ESCAPE.match(template, i) else TEMPLATE_REF.match(template, i)
+        if m:
+            num = int(m.group(1) or m.group(2))
+            if num == 0:
+                parts.append(m.group())
+            elif num in names:
+                parts.append(f"\\g<{names[num]}>")
+            else:
+                raise ValueError(f"invalid group reference {num}")
+            i = m.end()
+        elif template[i] == "\\":
+            parts.append(template[i:i + 2])
+            i += 2
+        else:
+            parts.append(template[i])
+            i += 1
+    return "".join(parts)
+
+class RuleSet:
+    ''' This object compiles a list of substitution rules into a single pattern.
+
+        Each rule is a tuple of the rule type ("literal" or "regex"), the pattern, and the replacement. The
+        maximum match length bounds the length of a regex match. The regexes are plain alternatives in the
+        combined pattern, so the cost of a scan is linear in the number of regex rules.
+    '''
+
+    def __init__(self, rules, max_match=MAX_MATCH):
+        self.rules = rules
+        self.literals = {}
+        self.regexes = {}
+        parts = []
+        regexParts = []
+        groupNames = set()
+        for idx, (kind, pattern, replacement) in enumerate(rules):
+            if kind == "literal":
+                if not pattern:
+                    raise CLIError(f"Rule {idx + 1} has an empty literal.")
+                # If a literal appears twice, the first rule wins.
+                self.literals.setdefault(pattern.encode("utf-8"), (idx, replacement.encode("utf-8")))
+            elif kind == "regex":
+                name = f"r{idx}"
+                try:
+                    regex = re.compile(pattern.encode("utf-8"), re.MULTILINE)
+                    for groupName in regex.groupindex:
+                        if RESERVED_NAME.match(groupName) or groupName in groupNames:
+                            raise re.error(f"group name \"{groupName}\" is reserved or used by another rule")
+                        groupNames.add(groupName)
+                    newPattern, numbers = rename_groups(pattern, name + "_")
+                    if re.compile(newPattern).groups != regex.groups:
+                        raise re.error("the groups could not be renamed")
+                    for groupName in TEMPLATE_NAME.findall(replacement):
+                        if groupName not in regex.groupindex:
+                            raise ValueError(f"unknown group name \"{groupName}\"")
+                    template = rename_template(replacement, numbers)
+                except (re.error, ValueError) as e:
+                    raise CLIError(f"Rule {idx + 1} has an invalid regex: {e}.")
+                self.regexes[name] = (idx, template.encode("utf-8"))
+                regexParts.append(b"(?P<" + name.encode() + b">" + newPattern.encode("utf-8") + b")")
+            else:
+                raise CLIError(f"Rule {idx + 1} has invalid type \"{kind}\".")
+        if self.literals:
+            parts.append(b"(?P<lit>" + trie_pattern(self.literals) + b")")
+        parts.extend(regexParts)
+        try:
+            self.pattern = re.compile(b"|".join(parts), re.MULTILINE)
+        except re.error as e:
+            raise CLIError(f"The rules cannot be combined: {e}.")
+        # This is the number of bytes at the end of a chunk that could be the start of an unfinished literal.
+        self.hold = max((len(literal) for literal in self.literals), default=1) - 1
+        self.max_match = max(max_match, self.hold)
+
+    def safe_length(self, data):
+        ''' Return the length of the chunk prefix in which every match can be completed.
+
+            With regex rules, the prefix ends at the last line end, but never more than the maximum match
+            length before the end of the chunk, so the held-back tail stays bounded.
+        '''
+        retVal = len(data) - self.hold
+        if self.regexes:
+            retVal = min(retVal, max(data.rfind(b"\n") + 1, len(data) - self.max_match))
+        return max(0, retVal)
+
+    def replace(self, m):
+        ''' Return the rule index and the replacement bytes for a match of the combined pattern. '''
+        if m.lastgroup == "lit":
+            return self.literals[m.group()]
+        idx, template = self.regexes[m.lastgroup]
+        return idx, m.expand(template)
+
+def load_rules(rules_file):
+    ''' Read the substitution rules from a tab-delimited rules file. '''
+    retVal = []
+    with open(rules_file, "r") as rulesStream:
+        for lineNum, line in enumerate(rulesStream, start=1):
+            line = line.rstrip("\r\n")
+            if not line.strip() or line.startswith("#"):
+                continue
+            fields = line.split("\t")
+            if len(fields) == 2:
+                fields.append("")
+            if len(fields) != 3:
+                raise CLIError(f"Line {lineNum} of {rules_file} does not have a type, pattern and replacement.")
+            retVal.append(tuple(fields))
+    return retVal
+
+def rewrite_stream(inStream, outStream, rules, chunk_size=CHUNK_SIZE):
+    ''' Copy a binary stream, applying all the substitution rules in a RuleSet.
+
+        The input is processed in chunks. After the matches in the safe part of a chunk are replaced, the
+        rest of the chunk, which could contain the start of a match, is carried over to the next chunk, along
+        with the byte before it, so that anchors and lookbehinds see the right context.
+        Returns a list of the hit counts for each rule.
+    '''
+    counts = [0] * len(rules.rules)
+    data = b""
+    # This is the number of bytes at the start of the data that have already been written.
+    base = 0
+    eof = False
+    while not eof:
+        chunk = inStream.read(chunk_size)
+        eof = not chunk
+        data += chunk
+        cutoff = len(data) if eof else max(base, rules.safe_length(data))
+        pos = base
+        for m in rules.pattern.finditer(data, base):
+            if m.start() >= cutoff:
+                break
+            idx, replacement = rules.replace(m)
+            outStream.write(data[pos:m.start()])
+            outStream.write(replacement)
+            pos = m.end()
+            counts[idx] += 1
+        keep = max(pos, cutoff)
+        outStream.write(data[pos:keep])
+        if keep > 0:
+            data = data[keep - 1:]
+            base = 1
+    return counts
+
+def fix_file(inBase, source, target, rules):
+    ''' Fix a single file. Returns the file name, the output size, and the hit counts for each rule. '''
+    inFile = os.path.join(source, inBase)
+    outFile = os.path.join(target, inBase)
+    with open(inFile, "rb") as inStream, open(outFile, "wb") as outStream:
+        counts = rewrite_stream(inStream, outStream, rules)
+        size = outStream.tell()
+    return inBase, size, counts
+
 def main(argv=None): # IGNORE:C0111
     '''source is the source directory, target is the destination directory.'''
 
@@ -70,6 +353,9 @@ USAGE
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
         parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-r", "--rules", dest="rules", help="tab-delimited file of substitution rules", metavar="rules")
+        parser.add_argument("-m", "--max-match", dest="maxMatch", type=int, default=MAX_MATCH, help="maximum length of a regex match [default: %(default)s]")
+        parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=1, help="number of parallel worker processes [default: %(default)s]")
         parser.add_argument(dest="source", help="path to source folder [default: %(default)s]", metavar="source", default="model")
         parser.add_argument(dest="target", help="path to new target folder [default: %(default)s]", metavar="target", default="model_fixed")
 
@@ -87,19 +373,30 @@ USAGE
         if verbose > 0:
             print("Verbose mode on")
 
-        inFiles = os.listdir(source)
+        inFiles = [f.name for f in os.scandir(source) if f.is_file()]
         print(f"{len(inFiles)} files found in directory {source}.")
         print(f"New files will be created in {target}.")
-        for inBase in inFiles:
-            inFile = os.path.join(source, inBase)
-            with open(inFile) as inStream:
-                lines = inStream.readlines()
-            outFile = os.path.join(target, inBase)
-            print(f"Copying {len(lines)} lines from {inFile} to {outFile}.")
-            with open(outFile, "w") as outStream:
-                for line in lines:
-                    line2 = line.replace("fig or ", "fig|")
-                    outStream.write(line2)
+        if args.maxMatch < 1:
+            raise CLIError("Maximum match length must be positive.")
+        rules = RuleSet(load_rules(args.rules) if args.rules else DEFAULT_RULES, args.maxMatch)
+        print(f"{len(rules.rules)} substitution rules loaded.")
+        fixer = functools.partial(fix_file, source=source, target=target, rules=rules)
+        executor = None
+        if args.jobs > 1:
+            executor = ProcessPoolExecutor(max_workers=args.jobs)
+            results = executor.map(fixer, inFiles)
+        else:
+            results = map(fixer, inFiles)
+        totals = [0] * len(rules.rules)
+        try:
+            for inBase, size, counts in results:
+                print(f"{sum(counts)} substitutions made in {size} bytes copied from {inBase}.")
+                totals = [total + count for total, count in zip(totals, counts)]
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        for (kind, pattern, replacement), total in zip(rules.rules, totals):
+            print(f"{total} hits for {kind} rule \"{pattern}\" -> \"{replacement}\".")
         return 0
     except KeyboardInterrupt:
         print("Interrupted!")
@@ -5,6 +5,17 @@ org.theseed.aurora.order_count -- Count species within order in SOLR dumps
 
 org.theseed.aurora.type_count is a simple command that processes a SOLR dump and counts the species in each order
 
+Only the first genome record in each genome.json file is parsed, and the reading stops as soon as that record
+is complete. The files are read by a pool of threads, since on network storage the time is dominated by file
+access latency. Use --threads to control the size of the pool.
+
+Use --ranks to specify a comma-delimited list of taxonomic ranks, from highest to lowest. All of the ranks are
+collected in a single pass, and a rollup table is produced for every pair of ranks, counting the genomes for
+each lower-rank taxon within each higher-rank taxon. The default is "order,species", which produces the
+species-within-order table. The taxon names are interned to integer codes as they are read, and the codes
+for each rank are kept in compact arrays. If --rollup is specified, each table is written to a separate
+tab-delimited file in the named directory; otherwise the tables are printed.
+
 @author:     Bruce Parrello
 
 @copyright:  2024 University of Chicago. All rights reserved.
@@ -14,20 +25,30 @@ org.theseed.aurora.type_count is a simple command that processes a SOLR dump and
 
 import sys
 import os
-import json
+import functools
+import numpy as np
 
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
+from array import array
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from aurora_utils import iter_json_array
 
 __all__ = []
 __version__ = 0.1
 __date__ = '2024-10-21'
-__updated__ = '2024-10-21'
+__updated__ = '2026-10-19'
 
 DEBUG = 1
 TESTRUN = 0
 PROFILE = 0
 
+FIRST_CHUNK_SIZE = 64 * 1024
+
+UNKNOWN = "(unknown)"
+
 class CLIError(Exception):
     '''Generic exception to raise and log different fatal errors.'''
     def __init__(self, msg):
@@ -38,6 +59,45 @@ class CLIError(Exception):
     def __unicode__(self):
         return self.msg
 
+def read_first_json_object(path, chunk_size=FIRST_CHUNK_SIZE):
+    ''' Return the first element of the JSON array in a file.
+
+        The file is read in small chunks, and reading stops as soon as the first element is complete. If the
+        file is empty or contains an empty array, None is returned.
+    '''
+    with open(path, "r") as f:
+        return next(iter_json_array(f, chunk_size), None)
+
+def read_ranks(dirpath, ranks):
+    ''' Return the taxon names at the specified ranks for the first genome in a dump directory.
+
+        A missing rank is returned as UNKNOWN. If the directory has no genome, None is returned.
+    '''
+    genome = read_first_json_object(dirpath + "/genome.json")
+    if genome is None:
+        return None
+    return [genome.get(rank) or UNKNOWN for rank in ranks]
+
+def intern_taxon(codes, names, name):
+    ''' Return the integer code for a taxon name, assigning the next code if the name is new. '''
+    code = codes.get(name)
+    if code is None:
+        code = len(names)
+        codes[name] = code
+        names.append(name)
+    return code
+
+def rollup(parent_codes, child_codes, child_count):
+    ''' Count the genomes for each distinct pair of parent and child taxon codes.
+
+        The code arrays are parallel, with one entry per genome. Returns arrays of the parent codes, child
+        codes and genome counts for each distinct pair, sorted by parent code and then child code.
+    '''
+    parents = np.frombuffer(parent_codes, dtype=np.intc).astype(np.int64)
+    children = np.frombuffer(child_codes, dtype=np.intc)
+    keys, counts = np.unique(parents * child_count + children, return_counts=True)
+    return keys // child_count, keys % child_count, counts
+
 def main(argv=None): # IGNORE:C0111
     '''Command line options.'''
 
@@ -70,12 +130,18 @@ USAGE
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
         parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-t", "--threads", dest="threads", type=int, default=32, help="number of file reader threads [default: %(default)s]")
+        parser.add_argument("-r", "--ranks", dest="ranks", default="order,species", help="comma-delimited list of ranks, from highest to lowest [default: %(default)s]")
+        parser.add_argument("--rollup", dest="rollup", help="directory for the rollup table files (if omitted, the tables are printed)", metavar="rollup")
         parser.add_argument(dest="paths", help="paths to folder(s) with source file(s) [default: %(default)s]", metavar="path", nargs='+')
 
         # Process arguments
         args = parser.parse_args()
 
         paths = args.paths
+        ranks = [rank.strip() for rank in args.ranks.split(",") if rank.strip()]
+        if len(ranks) < 2:
+            raise CLIError("At least two ranks are required.")
         verbose = args.verbose
 
         if verbose > 0:
@@ -83,40 +149,47 @@ USAGE
 
         # Set up some counters.
         dirsIn = 0
-        order_species_counts = {}
-        # Loop through the input directories.
+        # For each rank, we have a name-to-code map, a code-to-name list, and the array of codes by genome.
+        rank_codes = [{} for rank in ranks]
+        rank_names = [[] for rank in ranks]
+        rank_columns = [array('i') for rank in ranks]
+        # Compute the subdirectories of all the input directories.
+        dirpaths = []
         for inpath in paths:
-            # Get the subdirectories of this one.
-            subdirs = [f.name for f in os.scandir(inpath) if f.is_dir()]
-            for subdir in subdirs:
+            dirpaths.extend(inpath + "/" + f.name for f in os.scandir(inpath) if f.is_dir())
+        # Read the first genome record of each subdirectory in the thread pool.
+        with ThreadPoolExecutor(max_workers=args.threads) as executor:
+            for result in executor.map(functools.partial(read_ranks, ranks=ranks), dirpaths):
                 dirsIn += 1
-                # Compute the input and output paths for this subdirectory.
-                dirpath = inpath + "/" + subdir
-                # Get the genome_feature.json file in the input subdirectory.
-                fidfile = dirpath + "/genome.json"
-                # Read the feature dump as a JSON object.
-                with open(fidfile, "r") as f:
-                    json_str = f.read()
-                    json_obj = json.loads(json_str)
-                    genome = json_obj[0]
-                    order = genome["order"]
-                    species = genome["species"]
-                    if not (order in order_species_counts):
-                        order_species_counts[order] = {};
-                    species_map = order_species_counts[order]
-                    if not (species in species_map):
-                        species_map[species] = 1
-                    else:
-                        species_map[species] += 1
+                if result is None:
+                    continue
+                for i, name in enumerate(result):
+                    rank_columns[i].append(intern_taxon(rank_codes[i], rank_names[i], name))
         print(f"{dirsIn} directories processed.")
-        print("")
-        for order in order_species_counts:
-            orderStr = order.ljust(15, " ")
-            species_map = order_species_counts[order]
-            for species in species_map:
-                count = str(species_map[species]).rjust(15, " ")
-                speciesStr = species.ljust(15, " ")
-                print(f"{orderStr} {speciesStr} {count}")
+        if args.rollup:
+            Path(args.rollup).mkdir(parents=True, exist_ok=True)
+        # Produce the table for each pair of ranks.
+        for p in range(len(ranks)):
+            for c in range(p + 1, len(ranks)):
+                parent_names = rank_names[p]
+                child_names = rank_names[c]
+                parents, children, counts = rollup(rank_columns[p], rank_columns[c], max(len(child_names), 1))
+                if args.rollup:
+                    tableFile = f"{args.rollup}/{ranks[p]}_{ranks[c]}.tsv"
+                    with open(tableFile, "w") as outStream:
+                        outStream.write(f"{ranks[p]}\t{ranks[c]}\tcount\n")
+                        for parent, child, count in zip(parents, children, counts):
+                            outStream.write(f"{parent_names[parent]}\t{child_names[child]}\t{count}\n")
+                    print(f"{len(counts)} {ranks[c]} within {ranks[p]} rows written to {tableFile}.")
+                else:
+                    print("")
+                    if len(ranks) > 2:
+                        print(f"{ranks[c]} within {ranks[p]}:")
+                    for parent, child, count in zip(parents, children, counts):
+                        parentStr = parent_names[parent].ljust(15, " ")
+                        childStr = child_names[child].ljust(15, " ")
+                        countStr = str(count).rjust(15, " ")
+                        print(f"{parentStr} {childStr} {countStr}")
         return 0
     except KeyboardInterrupt:
         ### handle keyboard interrupt ###
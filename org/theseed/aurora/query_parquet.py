@@ -0,0 +1,169 @@
+#!/usr/local/bin/python3
+# encoding: utf-8
+'''
+org.theseed.aurora.query_parquet -- Count and group records in a SOLR dump Parquet cache
+
+org.theseed.aurora.query_parquet is a command that runs simple counting queries against the Parquet cache built
+by dump_to_parquet. The --table option selects the "features" or "genomes" table. Each --group option adds a
+column to group by, and each --filter option restricts the records to those whose column has the specified
+value. With no --group options, only the total record count is displayed. Otherwise, the count for each group
+is displayed, tab-delimited, from largest to smallest. Only the columns named in the query are read.
+
+The partition column "genome_dir" contains the name of the dump subdirectory from which each record came.
+
+The table schema is read from the schema file that dump_to_parquet keeps next to its manifest, so opening a
+table does not require reading the footer of every partition.
+
+@author:     Bruce Parrello
+
+@copyright:  2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+@contact:    brucep.mobile@gmail.com
+'''
+
+import sys
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+from aurora_utils import unify_table_schemas, load_table_schema, PARTITION_KEY
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-19'
+__updated__ = '2026-10-19'
+
+DEBUG = 1
+TESTRUN = 0
+PROFILE = 0
+
+class CLIError(Exception):
+    '''Generic exception to raise and log different fatal errors.'''
+    def __init__(self, msg):
+        super(CLIError).__init__(type(self))
+        self.msg = "E: %s" % msg
+    def __str__(self):
+        return self.msg
+    def __unicode__(self):
+        return self.msg
+
+def open_table(tablepath):
+    ''' Open a cache table as a dataset.
+
+        The partitions were written independently, so the dataset uses the unified schema saved with the
+        cache; a column missing from a partition reads as null, and a column stored with another type is cast.
+        If there is no saved schema, it is built from the partition footers.
+    '''
+    partitioning = ds.partitioning(pa.schema([(PARTITION_KEY, pa.string())]), flavor="hive")
+    schema = unify_table_schemas([load_table_schema(tablepath), partitioning.schema])
+    return ds.dataset(tablepath, format="parquet", partitioning=partitioning, schema=schema)
+
+def parse_filter(dataset, filter_spec):
+    ''' Convert a "column=value" filter specification into a dataset expression. '''
+    column, sep, value = filter_spec.partition("=")
+    if not sep:
+        raise CLIError(f"Invalid filter \"{filter_spec}\": the format is column=value.")
+    if column not in dataset.schema.names:
+        raise CLIError(f"Filter column {column} is not in the table.")
+    # The value is compared as a string, so it works for columns of any scalar type.
+    return pc.field(column).cast(pa.string()) == value
+
+def main(argv=None): # IGNORE:C0111
+    '''Command line options.'''
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+  Created by Bruce Parrello on %s.
+  Copyright 2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+  Licensed under the Apache License 2.0
+  http://www.apache.org/licenses/LICENSE-2.0
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+''' % (program_shortdesc, str(__date__))
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
+        parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-t", "--table", dest="table", choices=["features", "genomes"], default="features", help="table to query [default: %(default)s]")
+        parser.add_argument("-g", "--group", dest="groups", action="append", default=[], help="column to group by (repeatable)", metavar="column")
+        parser.add_argument("-f", "--filter", dest="filters", action="append", default=[], help="column=value restriction (repeatable)", metavar="filter")
+        parser.add_argument(dest="cache", help="path to Parquet cache folder", metavar="cache")
+
+        # Process arguments
+        args = parser.parse_args()
+
+        groups = args.groups
+        verbose = args.verbose
+
+        if verbose > 0:
+            print("Verbose mode on", file=sys.stderr)
+        tablepath = args.cache + "/" + args.table
+        if not os.path.isdir(tablepath):
+            raise CLIError(f"{args.cache} does not contain a {args.table} table.")
+        dataset = open_table(tablepath)
+        for column in groups:
+            if column not in dataset.schema.names:
+                raise CLIError(f"Group column {column} is not in the table.")
+        expression = None
+        for filter_spec in args.filters:
+            term = parse_filter(dataset, filter_spec)
+            expression = term if expression is None else (expression & term)
+        if not groups:
+            print(dataset.count_rows(filter=expression))
+        else:
+            table = dataset.to_table(columns=groups, filter=expression)
+            counts = table.group_by(groups).aggregate([(groups[0], "count", pc.CountOptions(mode="all"))])
+            counts = counts.sort_by([(groups[0] + "_count", "descending")])
+            print("\t".join(groups) + "\tcount")
+            for row in counts.to_pylist():
+                values = [str(row[column]) for column in groups]
+                print("\t".join(values) + "\t" + str(row[groups[0] + "_count"]))
+        return 0
+    except KeyboardInterrupt:
+        ### handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TESTRUN:
+            raise(e)
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+if __name__ == "__main__":
+    if DEBUG:
+        sys.argv.append("-v")
+    if TESTRUN:
+        import doctest
+        doctest.testmod()
+    if PROFILE:
+        import cProfile
+        import pstats
+        profile_filename = 'org.theseed.aurora.query_parquet_profile.txt'
+        cProfile.run('main()', profile_filename)
+        statsfile = open("profile_stats.txt", "wb")
+        p = pstats.Stats(profile_filename, stream=statsfile)
+        stats = p.strip_dirs().sort_stats('cumulative')
+        stats.print_stats()
+        statsfile.close()
+        sys.exit(0)
+    sys.exit(main())
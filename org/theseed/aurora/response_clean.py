@@ -5,7 +5,20 @@ org.theseed.aurora.response_clean -- Remove response headers from SOLR dumps
 
 org.theseed.aurora.response_clean is a simple command that processes a SOLR dump and removes response headers from the JSON
 
-It defines classes_and_methods
+Files that already contain a bare list are copied without being parsed, using a copy-on-write clone if the
+file system supports it, and otherwise an in-kernel copy. If --link is specified, they are hard-linked
+instead. For files with a response header, the docs array is streamed to the output one document at a time
+without building the whole response object.
+
+Use --jobs to process the files in parallel. Each output file is written under a temporary name and renamed
+when it is complete, so an interrupted run never leaves a partial output. A manifest in the output folder
+records the size and modification time of each input file that has been cleaned, and files that have not
+changed since they were cleaned are skipped, so an interrupted run can simply be restarted.
+
+Use --format jsonl to write the documents as JSON Lines, one document per line, in files with a ".jsonl"
+extension instead of ".json". Use --compress to compress the output files with gzip (".gz") or zstd
+(".zst"). Compressed output requires the documents to be rewritten, so the passthrough copy is used only
+for uncompressed JSON output. The zstd compression requires the zstandard package.
 
 @author:     Bruce Parrello
 
@@ -17,20 +30,36 @@ It defines classes_and_methods
 import sys
 import os
 import json
+import fcntl
+import shutil
+import gzip
+import functools
 
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from aurora_utils import JSON_CHUNK_SIZE, WHITESPACE, number_may_continue
+
 __all__ = []
 __version__ = 0.1
 __date__ = '2024-10-21'
-__updated__ = '2024-10-21'
+__updated__ = '2026-10-19'
 
 DEBUG = 1
 TESTRUN = 0
 PROFILE = 0
 
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# This is the Linux ioctl request code for cloning a file on a copy-on-write file system.
+FICLONE = 0x40049409
+
+MANIFEST_NAME = ".response_clean_manifest"
+
+COMPRESS_SUFFIXES = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
 class CLIError(Exception):
     '''Generic exception to raise and log different fatal errors.'''
     def __init__(self, msg):
@@ -41,6 +70,276 @@ class CLIError(Exception):
     def __unicode__(self):
         return self.msg
 
+class JsonReader:
+    ''' This object reads JSON incrementally from a text stream.
+
+        The caller walks the structure with the peek and expect methods, and decodes complete values with
+        read_value, so that a large container can be processed one element at a time.
+    '''
+
+    def __init__(self, stream, chunk_size=JSON_CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        ''' Read another chunk into the buffer, discarding the consumed text. Returns FALSE at end-of-file. '''
+        chunk = self.stream.read(self.chunk_size)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return not self.eof
+
+    def peek(self):
+        ''' Skip whitespace and return the next character, or an empty string at end-of-file. '''
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, ch):
+        ''' Skip whitespace and consume the specified punctuation character. '''
+        if self.peek() != ch:
+            raise ValueError(f"Expected \"{ch}\" in JSON input.")
+        self.pos += 1
+
+    def read_value(self):
+        ''' Decode the next complete JSON value. Returns the value and its source text. '''
+        self.peek()
+        while True:
+            end = None
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Usually this means the value runs past the end of the buffer.
+                if self.eof:
+                    raise
+            # A number near the end of the buffer may continue in the next chunk.
+            if end is not None and not self.eof and isinstance(value, (int, float)) and \
+                    number_may_continue(self.buffer, end):
+                end = None
+            if end is not None:
+                text = self.buffer[self.pos:end]
+                self.pos = end
+                return value, text
+            self._fill()
+
+    def iter_array(self):
+        ''' Consume a JSON array, yielding the value and source text of each element. '''
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+    def iter_object(self):
+        ''' Consume a JSON object, yielding each key. The caller must consume the value after each key. '''
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()[0]
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+def fast_copy(src, dst, link=False):
+    ''' Copy a file without passing the data through Python if possible.
+
+        If link is TRUE, the output is a hard link to the input. Otherwise, the file is cloned if the file
+        system supports it, and copied in the kernel with copy_file_range if not. A buffered copy is the
+        last resort.
+    '''
+    if link:
+        if os.path.lexists(dst):
+            os.remove(dst)
+        os.link(src, dst)
+        return
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        try:
+            fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+            return
+        except OSError:
+            pass
+        try:
+            while os.copy_file_range(fin.fileno(), fout.fileno(), COPY_CHUNK_SIZE) > 0:
+                pass
+            return
+        except (OSError, AttributeError):
+            # The kernel advances both file positions, so the buffered copy picks up where it stopped.
+            shutil.copyfileobj(fin, fout, COPY_CHUNK_SIZE)
+
+class JsonListWriter:
+    ''' This object writes documents to a text stream as a JSON list, using each document's source text. '''
+
+    def __init__(self, outStream):
+        self.outStream = outStream
+        self.delim = "["
+
+    def write(self, value, text):
+        self.outStream.write(self.delim)
+        self.outStream.write(text)
+        self.delim = ","
+
+    def finish(self):
+        self.outStream.write("[]" if self.delim == "[" else "]")
+
+class JsonLinesWriter:
+    ''' This object writes documents to a text stream as JSON Lines, one document per line. '''
+
+    def __init__(self, outStream):
+        self.outStream = outStream
+
+    def write(self, value, text):
+        # The source text may span several lines, so the document is re-encoded.
+        self.outStream.write(json.dumps(value))
+        self.outStream.write("\n")
+
+    def finish(self):
+        pass
+
+def open_output(jsonout, compress):
+    ''' Open an output file as a text stream with the specified compression. '''
+    if compress == "gzip":
+        return gzip.open(jsonout, "wt", compresslevel=6)
+    elif compress == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise CLIError("The zstandard package is required for zstd compression.")
+        return zstandard.open(jsonout, "wt")
+    else:
+        return open(jsonout, "w")
+
+def output_name(jsonfile, fmt, compress):
+    ''' Return the output file name for a JSON input file in the specified format and compression. '''
+    if fmt == "jsonl":
+        jsonfile = jsonfile[:-len(".json")] + ".jsonl"
+    return jsonfile + COMPRESS_SUFFIXES[compress]
+
+def stream_response(reader, writer):
+    ''' Process a JSON object from a SOLR dump.
+
+        If the object has a response header, the documents in it are streamed to the document writer and
+        None is returned. Otherwise, nothing is written and the object itself is returned.
+    '''
+    members = {}
+    found = False
+    for key in reader.iter_object():
+        if key == "response" and not found and reader.peek() == "{":
+            found = True
+            docsOut = False
+            for key2 in reader.iter_object():
+                if key2 == "docs" and not docsOut and reader.peek() == "[":
+                    docsOut = True
+                    for value, text in reader.iter_array():
+                        writer.write(value, text)
+                else:
+                    reader.read_value()
+        else:
+            members[key] = reader.read_value()[0]
+    return None if found else members
+
+def clean_file(jsonpath, jsonout, link=False, fmt="json", compress="none"):
+    ''' Clean a single JSON file from a SOLR dump.
+
+        The output is written to a temporary file in the output folder and renamed when it is complete.
+        Returns "empty" for an empty or scalar file, "copied" for a list, "cleaned" for a file with a
+        response header, or "single" for any other object.
+    '''
+    outdir, outname = os.path.split(jsonout)
+    tmpout = os.path.join(outdir, f".{outname}.{os.getpid()}.tmp")
+    try:
+        retVal = write_clean_file(jsonpath, tmpout, link, fmt, compress)
+        os.replace(tmpout, jsonout)
+    except BaseException:
+        if os.path.lexists(tmpout):
+            os.remove(tmpout)
+        raise
+    return retVal
+
+def write_clean_file(jsonpath, jsonout, link, fmt, compress):
+    ''' Write the cleaned version of a JSON file and return its status. '''
+    passthrough = (fmt == "json" and compress == "none")
+    with open(jsonpath, "r") as f:
+        reader = JsonReader(f)
+        start = reader.peek()
+        if start == "[" and passthrough:
+            # A list requires no alteration.
+            retVal = "copied"
+        else:
+            with open_output(jsonout, compress) as outStream:
+                writer = JsonLinesWriter(outStream) if fmt == "jsonl" else JsonListWriter(outStream)
+                if start == "[":
+                    # A list only needs to be reformatted.
+                    for value, text in reader.iter_array():
+                        writer.write(value, text)
+                    retVal = "copied"
+                elif start == "{":
+                    # Here we have a dictionary, which means we probably have a response header. If we have a
+                    # response header, stream out the document list. Otherwise, put the dictionary in a list.
+                    json_obj = stream_response(reader, writer)
+                    if json_obj is None:
+                        retVal = "cleaned"
+                    else:
+                        writer.write(json_obj, json.dumps(json_obj))
+                        retVal = "single"
+                else:
+                    # Here we have an empty file or a scalar. Return an empty list.
+                    retVal = "empty"
+                writer.finish()
+    if retVal == "copied" and passthrough:
+        fast_copy(jsonpath, jsonout, link)
+    return retVal
+
+def process_file(task, link=False, fmt="json", compress="none"):
+    ''' Clean a JSON file unless the manifest shows it has already been done.
+
+        The task is a tuple of the input path, the output path, and the input [size, mtime] recorded in the
+        manifest (or None). Returns the input path, the output path, the status ("skipped" if the file did
+        not need to be cleaned), and the input [size, mtime] before cleaning.
+    '''
+    jsonpath, jsonout, done = task
+    st = os.stat(jsonpath)
+    signature = [st.st_size, st.st_mtime_ns]
+    if signature == done and os.path.exists(jsonout):
+        status = "skipped"
+    else:
+        status = clean_file(jsonpath, jsonout, link, fmt, compress)
+    return jsonpath, jsonout, status, signature
+
+def load_manifest(manifest_file):
+    ''' Return a dictionary mapping each input path in the manifest to its [size, mtime] when cleaned.
+
+        The manifest is a JSON Lines file. An incomplete last line, left by an interrupted run, is ignored.
+    '''
+    retVal = {}
+    if os.path.isfile(manifest_file):
+        with open(manifest_file, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                retVal[entry["in"]] = [entry["size"], entry["mtime"]]
+    return retVal
+
 def main(argv=None): # IGNORE:C0111
     '''Command line options.'''
 
@@ -73,6 +372,10 @@ USAGE
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
         parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=1, help="number of parallel worker processes [default: %(default)s]")
+        parser.add_argument("--format", dest="format", choices=["json", "jsonl"], default="json", help="output format [default: %(default)s]")
+        parser.add_argument("--compress", dest="compress", choices=list(COMPRESS_SUFFIXES), default="none", help="output compression [default: %(default)s]")
+        parser.add_argument("--link", dest="link", action="store_true", help="hard-link files that require no alteration instead of copying them")
         parser.add_argument(dest="outpath", help="path to folder to contain output files", metavar="outpath")
         parser.add_argument(dest="paths", help="paths to folder(s) with source file(s) [default: %(default)s]", metavar="path", nargs='+')
 
@@ -93,7 +396,12 @@ USAGE
         cleaned = 0
         singleIn = 0
         emptyIn = 0
-        # Loop through the input directories.
+        skipped = 0
+        Path(outpath).mkdir(parents=True, exist_ok=True)
+        manifest_file = outpath + "/" + MANIFEST_NAME
+        manifest = load_manifest(manifest_file)
+        # Loop through the input directories, collecting the files to clean.
+        tasks = []
         for inpath in paths:
             # Get the subdirectories of this one.
             subdirs = [f.name for f in os.scandir(inpath) if f.is_dir()]
@@ -112,40 +420,37 @@ USAGE
                         filesIn += 1
                         # Get the input and output file names.
                         jsonpath = dirpath + "/" + jsonfile
-                        jsonout = outdir + "/" + jsonfile
-                        print(f"Copying {jsonpath} to {jsonout}.")
-                        # Read the dump as a JSON object.
-                        with open(jsonpath, "r") as f:
-                            json_str = f.read()
-                        if json_str == "":
-                            emptyIn +=1
-                            with open(jsonout, "w") as f:
-                                f.write("[]")
-                        else:
-                            json_obj = json.loads(json_str)
-                            if isinstance(json_obj, list):
-                                # A list requires no alteration.
-                                doc_obj = json_obj
-                                copied += 1
-                            elif isinstance(json_obj, dict):
-                                # Here we have a dictionary, which means we probably
-                                # have a response header. If we have a response header, get
-                                # the document element and return it. Otherwise, but the
-                                # dictionary object in a list.
-                                if "response" in json_obj:
-                                    doc_obj = json_obj["response"]["docs"]
-                                    cleaned += 1
-                                else:
-                                    doc_obj = [json_obj]
-                                    singleIn += 1
-                            else:
-                                # Here we have a scalar. Return an empty list.
-                                doc_obj = []
-                                emptyIn += 1
-                            # Write the output file.
-                            with open(jsonout, "w") as f:
-                                f.write(json.dumps(doc_obj))
-        print(f"{dirsIn} directories, {filesIn} files, {cleaned} cleaned, {copied} copied, {emptyIn} empty, {singleIn} singletons.")
+                        jsonout = outdir + "/" + output_name(jsonfile, args.format, args.compress)
+                        tasks.append((jsonpath, jsonout, manifest.get(jsonpath)))
+        # Clean the files. Each completed file is recorded in the manifest as soon as it is done.
+        worker = functools.partial(process_file, link=args.link, fmt=args.format, compress=args.compress)
+        executor = None
+        if args.jobs > 1:
+            executor = ProcessPoolExecutor(max_workers=args.jobs)
+            results = executor.map(worker, tasks, chunksize=16)
+        else:
+            results = map(worker, tasks)
+        try:
+            with open(manifest_file, "a") as manifestStream:
+                for jsonpath, jsonout, status, signature in results:
+                    if status == "skipped":
+                        skipped += 1
+                        continue
+                    print(f"Copied {jsonpath} to {jsonout}.")
+                    if status == "copied":
+                        copied += 1
+                    elif status == "cleaned":
+                        cleaned += 1
+                    elif status == "single":
+                        singleIn += 1
+                    else:
+                        emptyIn += 1
+                    manifestStream.write(json.dumps({"in": jsonpath, "size": signature[0], "mtime": signature[1]}) + "\n")
+                    manifestStream.flush()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+        print(f"{dirsIn} directories, {filesIn} files, {cleaned} cleaned, {copied} copied, {emptyIn} empty, {singleIn} singletons, {skipped} skipped.")
         return 0
     except KeyboardInterrupt:
         ### handle keyboard interrupt ###
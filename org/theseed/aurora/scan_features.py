@@ -0,0 +1,227 @@
+#!/usr/local/bin/python3
+# encoding: utf-8
+'''
+org.theseed.aurora.scan_features -- Summarize CoreSEED features and aliases in a single pass
+
+org.theseed.aurora.scan_features walks the Features/<type>/tbl files of a CoreSEED data directory once and
+collects several aggregates at the same time: the alias prefix counts, the prefix counts per genome, the
+feature counts per type and per genome, and one example alias for each prefix. These are saved to a compact
+gzipped JSON summary file. Once the summary exists, the reports can be produced from it without touching
+the CoreSEED tree again.
+
+To build the summary, specify the CoreSEED data directory with --core. If --core is omitted, the existing
+summary file is read instead. The --report option selects the report to print.
+
+@author:     Bruce Parrello
+
+@copyright:  2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+@contact:    brucep.mobile@gmail.com
+'''
+
+import sys
+import os
+import re
+import gzip
+import json
+
+from argparse import ArgumentParser
+from argparse import RawDescriptionHelpFormatter
+
+__all__ = []
+__version__ = 0.1
+__date__ = '2026-10-19'
+__updated__ = '2026-10-19'
+
+DEBUG = 1
+TESTRUN = 0
+PROFILE = 0
+
+ALIAS_PATTERN = re.compile("([^:|]+)[:|]")
+
+REPORTS = ["prefixes", "types", "genomes", "prefix-genomes"]
+
+class CLIError(Exception):
+    '''Generic exception to raise and log different fatal errors.'''
+    def __init__(self, msg):
+        super(CLIError).__init__(type(self))
+        self.msg = "E: %s" % msg
+    def __str__(self):
+        return self.msg
+    def __unicode__(self):
+        return self.msg
+
+def scan_core(path):
+    ''' Walk the CoreSEED organism directories and return the summary dictionary.
+
+        The summary contains the list of genome IDs, and the prefix-by-genome counts are stored sparsely
+        as a map from the genome's index in that list to the count.
+    '''
+    genomes = []
+    prefix_counts = {}
+    prefix_genomes = {}
+    examples = {}
+    type_counts = {}
+    genome_counts = []
+    orgdir = path + "/Organisms"
+    genome_dirs = sorted(genome_dir.name for genome_dir in os.scandir(orgdir) if genome_dir.is_dir())
+    for genome_dir in genome_dirs:
+        print(f"Processing genome {genome_dir}.", file=sys.stderr)
+        gidx = len(genomes)
+        genomes.append(genome_dir)
+        gcount = 0
+        featdir = orgdir + "/" + genome_dir + "/Features"
+        if not os.path.isdir(featdir):
+            genome_counts.append(0)
+            continue
+        type_dirs = [type_dir.name for type_dir in os.scandir(featdir) if type_dir.is_dir()]
+        for type_dir in type_dirs:
+            tbl_file = featdir + "/" + type_dir + "/tbl"
+            if not os.path.isfile(tbl_file):
+                continue
+            tcount = 0
+            with open(tbl_file, "r") as tbl_stream:
+                for line in tbl_stream:
+                    tcount += 1
+                    fields = line.rstrip("\n").split("\t")
+                    for i in range(2, len(fields)):
+                        alias = fields[i]
+                        m = ALIAS_PATTERN.match(alias)
+                        if m:
+                            alias_type = m.group(1)
+                            if alias_type in prefix_counts:
+                                prefix_counts[alias_type] += 1
+                                genome_map = prefix_genomes[alias_type]
+                                genome_map[gidx] = genome_map.get(gidx, 0) + 1
+                            else:
+                                prefix_counts[alias_type] = 1
+                                prefix_genomes[alias_type] = {gidx: 1}
+                                examples[alias_type] = alias
+            type_counts[type_dir] = type_counts.get(type_dir, 0) + tcount
+            gcount += tcount
+        genome_counts.append(gcount)
+    # JSON keys must be strings, so the sparse genome maps are stored as parallel index/count lists.
+    sparse = {prefix: [list(genome_map.keys()), list(genome_map.values())]
+              for prefix, genome_map in prefix_genomes.items()}
+    return {"genomes": genomes, "genome_counts": genome_counts, "type_counts": type_counts,
+            "prefix_counts": prefix_counts, "prefix_genomes": sparse, "examples": examples}
+
+def save_summary(summary, summary_file):
+    ''' Write the summary dictionary to a gzipped JSON file. '''
+    with gzip.open(summary_file, "wt") as f:
+        json.dump(summary, f, separators=(",", ":"))
+
+def load_summary(summary_file):
+    ''' Read a summary dictionary from a gzipped JSON file. '''
+    with gzip.open(summary_file, "rt") as f:
+        return json.load(f)
+
+def print_report(summary, report, prefix=None):
+    ''' Print the requested report from the summary dictionary. '''
+    if report == "prefixes":
+        counts = summary["prefix_counts"]
+        examples = summary["examples"]
+        for alias_type in sorted(counts, key=counts.get, reverse=True):
+            genome_count = len(summary["prefix_genomes"][alias_type][0])
+            print(f"{alias_type}\t{counts[alias_type]}\t{genome_count}\t{examples[alias_type]}")
+    elif report == "types":
+        counts = summary["type_counts"]
+        for ftype in sorted(counts, key=counts.get, reverse=True):
+            print(f"{ftype}\t{counts[ftype]}")
+    elif report == "genomes":
+        for genome, count in zip(summary["genomes"], summary["genome_counts"]):
+            print(f"{genome}\t{count}")
+    elif report == "prefix-genomes":
+        if prefix is None:
+            raise CLIError("The prefix-genomes report requires --prefix.")
+        if prefix not in summary["prefix_genomes"]:
+            raise CLIError(f"Prefix {prefix} was not found in any genome.")
+        genomes = summary["genomes"]
+        indices, counts = summary["prefix_genomes"][prefix]
+        for gidx, count in sorted(zip(indices, counts), key=lambda x: x[1], reverse=True):
+            print(f"{genomes[gidx]}\t{count}")
+
+def main(argv=None): # IGNORE:C0111
+    '''Command line options.'''
+
+    if argv is None:
+        argv = sys.argv
+    else:
+        sys.argv.extend(argv)
+
+    program_name = os.path.basename(sys.argv[0])
+    program_version = "v%s" % __version__
+    program_build_date = str(__updated__)
+    program_version_message = '%%(prog)s %s (%s)' % (program_version, program_build_date)
+    program_shortdesc = __import__('__main__').__doc__.split("\n")[1]
+    program_license = '''%s
+
+  Created by Bruce Parrello on %s.
+  Copyright 2026 Fellowship for Interpretation of Genomes. All rights reserved.
+
+  Licensed under the Apache License 2.0
+  http://www.apache.org/licenses/LICENSE-2.0
+
+  Distributed on an "AS IS" basis without warranties
+  or conditions of any kind, either express or implied.
+
+USAGE
+''' % (program_shortdesc, str(__date__))
+
+    try:
+        # Setup argument parser
+        parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
+        parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
+        parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("--core", dest="core", help="path to CoreSEED data directory to scan (if omitted, the summary file is read)", metavar="core")
+        parser.add_argument("--report", dest="report", choices=REPORTS, default="prefixes", help="report to print [default: %(default)s]")
+        parser.add_argument("--prefix", dest="prefix", help="alias prefix for the prefix-genomes report", metavar="prefix")
+        parser.add_argument(dest="summary", help="path to summary file", metavar="summary")
+
+        # Process arguments
+        args = parser.parse_args()
+
+        summary_file = args.summary
+        verbose = args.verbose
+
+        if verbose > 0:
+            print("Verbose mode on", file=sys.stderr)
+        if args.core:
+            summary = scan_core(args.core)
+            save_summary(summary, summary_file)
+            print(f"{len(summary['genomes'])} genomes summarized in {summary_file}.", file=sys.stderr)
+        else:
+            if not os.path.isfile(summary_file):
+                raise CLIError(f"Summary file {summary_file} does not exist.")
+            summary = load_summary(summary_file)
+        print_report(summary, args.report, args.prefix)
+        return 0
+    except KeyboardInterrupt:
+        ### handle keyboard interrupt ###
+        return 0
+    except Exception as e:
+        if DEBUG or TESTRUN:
+            raise(e)
+        indent = len(program_name) * " "
+        sys.stderr.write(program_name + ": " + repr(e) + "\n")
+        sys.stderr.write(indent + "  for help use --help")
+        return 2
+
+if __name__ == "__main__":
+    if DEBUG:
+        sys.argv.append("-v")
+    if TESTRUN:
+        import doctest
+        doctest.testmod()
+    if PROFILE:
+        import cProfile
+        import pstats
+        profile_filename = 'org.theseed.aurora.scan_features_profile.txt'
+        cProfile.run('main()', profile_filename)
+        statsfile = open("profile_stats.txt", "wb")
+        p = pstats.Stats(profile_filename, stream=statsfile)
+        stats = p.strip_dirs().sort_stats('cumulative')
+        stats.print_stats()
+        statsfile.close()
+        sys.exit(0)
+    sys.exit(main())
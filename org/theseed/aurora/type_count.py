@@ -5,6 +5,17 @@ org.theseed.aurora.type_count -- Count feature types in SOLR dumps
 
 org.theseed.aurora.type_count is a simple command that processes a SOLR dump and counts the different feature types
 
+By default the feature_type field is counted. Use --field (repeatable) to count other fields instead; nested
+fields are specified as dotted paths. All the fields are counted in the same pass through the dump. The
+feature dumps are streamed one feature at a time, so memory use does not depend on the dump size, but each
+feature is still decoded in full before its fields are selected. Use --jobs to process the dump
+subdirectories in parallel.
+
+Use --matrix to save the per-genome counts of one field (by default feature_type) as a genome-by-value
+matrix in a NumPy .npz file. The genome IDs (subdirectory names) and the value labels are saved with the
+matrix, along with robust outlier statistics for each column. Genomes whose counts are outliers, or which
+are missing a value that the median genome has, are listed at the end of the report.
+
 @author:     Bruce Parrello
 
 @copyright:  2024 University of Chicago. All rights reserved.
@@ -15,19 +26,30 @@ org.theseed.aurora.type_count is a simple command that processes a SOLR dump and
 import sys
 import os
 import json
+import functools
+import numpy as np
 
 from argparse import ArgumentParser
 from argparse import RawDescriptionHelpFormatter
+from concurrent.futures import ProcessPoolExecutor
+from aurora_utils import iter_json_array
 
 __all__ = []
 __version__ = 0.1
 __date__ = '2024-10-21'
-__updated__ = '2024-10-21'
+__updated__ = '2026-10-19'
 
 DEBUG = 1
 TESTRUN = 0
 PROFILE = 0
 
+MISSING = "(missing)"
+
+# This scales a median absolute deviation to a standard deviation for normally-distributed data.
+MAD_SCALE = 0.6745
+# This does the same for a mean absolute deviation, which is used when the median deviation is zero.
+MEAN_AD_SCALE = 0.7979
+
 class CLIError(Exception):
     '''Generic exception to raise and log different fatal errors.'''
     def __init__(self, msg):
@@ -38,6 +60,94 @@ class CLIError(Exception):
     def __unicode__(self):
         return self.msg
 
+def get_field(obj, path):
+    ''' Return the value at a dotted field path in a JSON object, or None if it is missing. '''
+    for key in path.split("."):
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+def value_keys(value):
+    ''' Return the count keys for a field value. Each element of a list is counted separately. '''
+    if value is None:
+        return [MISSING]
+    elif isinstance(value, list):
+        return [v if isinstance(v, str) else json.dumps(v) for v in value]
+    elif isinstance(value, str):
+        return [value]
+    else:
+        return [json.dumps(value)]
+
+def count_fields(dirpath, fields):
+    ''' Count the values of the specified fields in the feature dump of a single subdirectory.
+
+        Returns a dictionary mapping each field path to a dictionary of value counts.
+    '''
+    counts = {field: {} for field in fields}
+    # Get the genome_feature.json file in the input subdirectory.
+    fidfile = dirpath + "/genome_feature.json"
+    # Stream the feature objects out of the feature dump.
+    with open(fidfile, "r") as f:
+        for fidobj in iter_json_array(f):
+            for field in fields:
+                field_counts = counts[field]
+                for key in value_keys(get_field(fidobj, field)):
+                    if key in field_counts:
+                        field_counts[key] += 1
+                    else:
+                        field_counts[key] = 1
+    return counts
+
+def merge_counts(totals, counts):
+    ''' Add the field value counts from one subdirectory into the running totals. '''
+    for field, field_counts in counts.items():
+        total_counts = totals[field]
+        for key, count in field_counts.items():
+            total_counts[key] = total_counts.get(key, 0) + count
+
+def build_matrix(row_counts):
+    ''' Build a genome-by-value count matrix from a list of per-genome value count dictionaries.
+
+        Returns the matrix and the sorted list of column labels.
+    '''
+    columns = sorted({key for counts in row_counts for key in counts})
+    col_index = {key: i for i, key in enumerate(columns)}
+    matrix = np.zeros((len(row_counts), len(columns)), dtype=np.int64)
+    for i, counts in enumerate(row_counts):
+        for key, count in counts.items():
+            matrix[i, col_index[key]] = count
+    return matrix, columns
+
+def outlier_stats(matrix):
+    ''' Compute robust per-column statistics for a count matrix.
+
+        Returns the column medians, the column median absolute deviations, and a matrix of robust z-scores.
+        For columns whose median absolute deviation is zero, the mean absolute deviation is used instead, and
+        if that is also zero, the column is constant and its z-scores are zero.
+    '''
+    median = np.median(matrix, axis=0)
+    deviation = np.abs(matrix - median)
+    mad = np.median(deviation, axis=0)
+    scale = np.where(mad > 0, mad / MAD_SCALE, deviation.mean(axis=0) / MEAN_AD_SCALE)
+    z = np.divide(matrix - median, scale, out=np.zeros(matrix.shape), where=scale > 0)
+    return median, mad, z
+
+def write_matrix(matrix_file, genomes, row_counts, z_limit):
+    ''' Save the genome-by-value matrix and its outlier statistics to an .npz file.
+
+        Returns a list of (genome, label, count, median, z) tuples for the outlier cells. A cell is an outlier
+        if its robust z-score exceeds the limit in absolute value, or if it is zero and the column median is
+        not.
+    '''
+    matrix, columns = build_matrix(row_counts)
+    median, mad, z = outlier_stats(matrix)
+    np.savez_compressed(matrix_file, counts=matrix, genomes=np.array(genomes), labels=np.array(columns),
+                        median=median, mad=mad, z=z)
+    flagged = (np.abs(z) > z_limit) | ((matrix == 0) & (median > 0))
+    return [(genomes[i], columns[j], int(matrix[i, j]), float(median[j]), float(z[i, j]))
+            for i, j in zip(*np.nonzero(flagged))]
+
 def main(argv=None): # IGNORE:C0111
     '''Command line options.'''
 
@@ -70,12 +180,21 @@ USAGE
         parser = ArgumentParser(description=program_license, formatter_class=RawDescriptionHelpFormatter)
         parser.add_argument("-v", "--verbose", dest="verbose", action="count", help="set verbosity level [default: %(default)s]")
         parser.add_argument('-V', '--version', action='version', version=program_version_message)
+        parser.add_argument("-f", "--field", dest="fields", action="append", help="field to count, with dots separating nested keys (repeatable) [default: feature_type]", metavar="field")
+        parser.add_argument("--matrix", dest="matrix", help="output .npz file for the per-genome count matrix", metavar="matrix")
+        parser.add_argument("--matrix-field", dest="matrix_field", default="feature_type", help="field to count per genome in the matrix [default: %(default)s]", metavar="field")
+        parser.add_argument("--outlier-z", dest="outlier_z", type=float, default=3.5, help="robust z-score threshold for matrix outliers [default: %(default)s]")
+        parser.add_argument("-j", "--jobs", dest="jobs", type=int, default=1, help="number of parallel worker processes [default: %(default)s]")
         parser.add_argument(dest="paths", help="paths to folder(s) with source file(s) [default: %(default)s]", metavar="path", nargs='+')
 
         # Process arguments
         args = parser.parse_args()
 
         paths = args.paths
+        fields = args.fields or ["feature_type"]
+        matrix_field = args.matrix_field
+        # The matrix field must be counted, even if it is not in the report.
+        counted = fields if (not args.matrix or matrix_field in fields) else fields + [matrix_field]
         verbose = args.verbose
 
         if verbose > 0:
@@ -83,33 +202,47 @@ USAGE
 
         # Set up some counters.
         dirsIn = 0
-        type_counts = {}
-        # Loop through the input directories.
+        totals = {field: {} for field in counted}
+        # The matrix rows are collected here.
+        genomes = []
+        row_counts = []
+        # Compute the subdirectories of all the input directories.
+        dirpaths = []
         for inpath in paths:
-            # Get the subdirectories of this one.
-            subdirs = [f.name for f in os.scandir(inpath) if f.is_dir()]
-            for subdir in subdirs:
+            dirpaths.extend(inpath + "/" + f.name for f in os.scandir(inpath) if f.is_dir())
+        counter = functools.partial(count_fields, fields=counted)
+        if args.jobs > 1:
+            executor = ProcessPoolExecutor(max_workers=args.jobs)
+            results = executor.map(counter, dirpaths, chunksize=16)
+        else:
+            executor = None
+            results = map(counter, dirpaths)
+        try:
+            for dirpath, counts in zip(dirpaths, results):
                 dirsIn += 1
-                # Compute the input and output paths for this subdirectory.
-                dirpath = inpath + "/" + subdir
-                # Get the genome_feature.json file in the input subdirectory.
-                fidfile = dirpath + "/genome_feature.json"
-                # Read the feature dump as a JSON object.
-                with open(fidfile, "r") as f:
-                    json_str = f.read()
-                    json_obj = json.loads(json_str)
-                    for fidobj in json_obj:
-                        ftype = fidobj["feature_type"]
-                        if ftype in type_counts:
-                            type_counts[ftype] += 1
-                        else:
-                            type_counts[ftype] = 1
+                merge_counts(totals, counts)
+                if args.matrix:
+                    genomes.append(os.path.basename(dirpath))
+                    row_counts.append(counts[matrix_field])
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
         print(f"{dirsIn} directories processed.")
-        print("")
-        for ftype in type_counts:
-            count = str(type_counts[ftype]).rjust(15, " ")
-            typestr = ftype.ljust(15, " ")
-            print(f"{typestr} {count}")
+        for field in fields:
+            print("")
+            if len(fields) > 1:
+                print(f"{field}:")
+            field_counts = totals[field]
+            for key in field_counts:
+                count = str(field_counts[key]).rjust(15, " ")
+                keystr = key.ljust(15, " ")
+                print(f"{keystr} {count}")
+        if args.matrix:
+            outliers = write_matrix(args.matrix, genomes, row_counts, args.outlier_z)
+            print("")
+            print(f"{len(genomes)} genomes written to matrix {args.matrix}. {len(outliers)} outliers found.")
+            for genome, label, count, median, z in outliers:
+                print(f"{genome}\t{label}\t{count}\t{median:g}\t{z:.2f}")
         return 0
     except KeyboardInterrupt:
         ### handle keyboard interrupt ###